@@ -1,13 +1,21 @@
 import argparse
+import bisect
 import csv
 import datetime
 import gzip
 import json
+import math
 import os
 import re
+import sys
+import threading
 import zipfile
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
 
 # from datetime import datetime
+import numpy as np
+import shapely
 from shapely import from_wkt, STRtree
 from shapely.geometry import shape, Point
 
@@ -15,96 +23,1270 @@ csv.field_size_limit(10_000_000)
 
 directory = os.path.dirname(os.path.realpath(__file__))
 
-zipcode_shapes = []
-with open(os.path.join(directory, "zipcodes.geojson")) as f:
-    for feature in json.load(f)["features"]:
-        zipcode_shapes.append(
-            (shape(feature["geometry"]), int(feature["properties"]["zip_code"]))
-        )
+# "layer name": (module variable holding its shapes, data file, function reading the value from feature properties)
+geojson_layers = {
+    "zipcodes": (
+        "zipcode_shapes",
+        "zipcodes.geojson",
+        lambda properties: int(properties["zip_code"]),
+    ),
+    "municipalities": (
+        "municipality_shapes",
+        "municipalities.geojson",
+        lambda properties: properties["NAME"],
+    ),
+    "old_city_council_districts": (
+        "old_city_council_districts_shapes",
+        "old_city_council_districts.geojson",
+        lambda properties: int(float(properties["citydst"])),
+    ),
+    "city_council_districts": (
+        "city_council_districts_shapes",
+        "city_council_districts.geojson",
+        lambda properties: int(float(properties["council"])),
+    ),
+}
+
+
+# Description
+# - Reads the shapes of a GeoJSON layer
+# Accepts
+# - layer (str): a key in geojson_layers
+# - path (str): the GeoJSON file (optional - defaults to the file packaged with geochatt)
+# Returns
+# - shapes (list of tuples): (shape, value) for each feature
+def _read_geojson_layer_(layer, path=None):
+    variable, filename, get_value = geojson_layers[layer]
+    shapes = []
+    with open(path or os.path.join(directory, filename)) as f:
+        for feature in json.load(f)["features"]:
+            shapes.append(
+                (shape(feature["geometry"]), get_value(feature["properties"]))
+            )
+    return shapes
+
+
+zipcode_shapes = _read_geojson_layer_("zipcodes")
+
+municipality_shapes = _read_geojson_layer_("municipalities")
+
+old_city_council_districts_shapes = _read_geojson_layer_("old_city_council_districts")
+
+city_council_districts_shapes = _read_geojson_layer_("city_council_districts")
 
-municipality_shapes = []
-with open(os.path.join(directory, "municipalities.geojson")) as f:
-    for feature in json.load(f)["features"]:
-        municipality_shapes.append(
-            (shape(feature["geometry"]), feature["properties"]["NAME"])
-        )
 
-old_city_council_districts_shapes = []
-with open(os.path.join(directory, "old_city_council_districts.geojson")) as f:
-    for feature in json.load(f)["features"]:
-        old_city_council_districts_shapes.append(
-            (shape(feature["geometry"]), int(float(feature["properties"]["citydst"])))
+# "layer name": number of points rejected without an index lookup because they are outside the layer's
+# extent or the convex hull of its geometries - like (0, 0), swapped coordinates, or points outside the county
+rejected_points = {}
+
+
+# Description
+# - Returns the extent (xmin, ymin, xmax, ymax) and the prepared convex hull of geometries with the given bounds
+# Accepts
+# - bounds: array of shape (n, 4) - the bounds of each geometry
+def _get_extent_(bounds):
+    bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+    extent = (
+        float(bounds[:, 0].min()),
+        float(bounds[:, 1].min()),
+        float(bounds[:, 2].max()),
+        float(bounds[:, 3].max()),
+    )
+    # the hull of the corners of every bounding box contains the hull of the geometries
+    corners = bounds[:, [0, 1, 0, 3, 2, 1, 2, 3]].reshape(-1, 2)
+    hull = shapely.convex_hull(shapely.multipoints(corners))
+    shapely.prepare(hull)
+    return extent, hull
+
+
+def _count_rejected_(layer, count):
+    if layer is not None and count:
+        rejected_points[layer] = rejected_points.get(layer, 0) + count
+
+
+# Description
+# - Returns whether a point is too far outside a layer to be in (or within margin of) any of its geometries
+# Accepts
+# - layer (str): the layer name, for rejected_points
+# - index (dict): the layer's index, with "extent" and "hull" from _get_extent_
+# - x, y (float): the point, in the coordinates of the index
+# - margin (float): how far outside the hull a point may be and still be looked up
+def _reject_(layer, index, x, y, margin=0.0):
+    xmin, ymin, xmax, ymax = index["extent"]
+    # NaN fails every comparison, so it is rejected too
+    if (
+        xmin - margin <= x <= xmax + margin
+        and ymin - margin <= y <= ymax + margin
+        # the distance is only measured for the few points outside the hull
+        and (
+            shapely.intersects_xy(index["hull"], x, y)
+            or (margin and shapely.dwithin(index["hull"], Point(x, y), margin))
         )
+    ):
+        return False
+    _count_rejected_(layer, 1)
+    return True
+
 
-city_council_districts_shapes = []
-with open(os.path.join(directory, "city_council_districts.geojson")) as f:
-    for feature in json.load(f)["features"]:
-        city_council_districts_shapes.append(
-            (shape(feature["geometry"]), int(float(feature["properties"]["council"])))
+# Description
+# - Batch version of _reject_ - rejections are not counted if layer is None
+# Returns
+# - inside: boolean array, False for the points that are rejected
+def _inside_(layer, index, x, y, margin=0.0):
+    xmin, ymin, xmax, ymax = index["extent"]
+    inside = (
+        (x >= xmin - margin)
+        & (x <= xmax + margin)
+        & (y >= ymin - margin)
+        & (y <= ymax + margin)
+    )
+    rows = np.flatnonzero(inside)
+    inside[rows] = shapely.intersects_xy(index["hull"], x[rows], y[rows])
+    if margin:
+        rows = rows[~inside[rows]]
+        inside[rows] = shapely.dwithin(
+            index["hull"], shapely.points(x[rows], y[rows]), margin
         )
+    _count_rejected_(layer, int(len(inside) - inside.sum()))
+    return inside
 
 
-def _get_shape_(shapes, longitude, latitude):
+def _get_shape_(name, shapes, longitude, latitude):
+    longitude = float(longitude)
+    latitude = float(latitude)
+    if _reject_(name, _get_shape_strtree_(name, shapes), longitude, latitude):
+        return None
     point = Point(longitude, latitude)
     for shape, value in shapes:
         if shape.contains(point):
             return value
 
 
-def get_city_council_district(longitude, latitude, date=None):
+# Description
+# - Returns the name and shapes of the council district boundaries in effect on a date
+# Accepts
+# - date: str in the format MM-DD-YYYY (optional - defaults to the current boundaries)
+def _get_city_council_districts_layer_(date=None):
     # If the user inputs a date (must be MM-DD-YYYY), try to make a date object out of it
     try:
         date_obj = datetime.datetime.strptime(date, "%m-%d-%Y").date()
     except Exception:
         # If exception, default to current council district boundaries
-        return _get_shape_(city_council_districts_shapes, longitude, latitude)
+        return "city_council_districts", city_council_districts_shapes
     else:
         # If before April 14, 2025, use old council district boundaries
         if date_obj < datetime.date(2025, 4, 14):
-            return _get_shape_(old_city_council_districts_shapes, longitude, latitude)
+            return "old_city_council_districts", old_city_council_districts_shapes
         else:
-            return _get_shape_(city_council_districts_shapes, longitude, latitude)
+            return "city_council_districts", city_council_districts_shapes
+
+
+def get_city_council_district(longitude, latitude, date=None):
+    name, shapes = _get_city_council_districts_layer_(date)
+    return _get_shape_(name, shapes, longitude, latitude)
 
 
 def get_municipality(longitude, latitude):
-    return _get_shape_(municipality_shapes, longitude, latitude)
+    return _get_shape_("municipalities", municipality_shapes, longitude, latitude)
 
 
 def get_zipcode(longitude, latitude):
-    return _get_shape_(zipcode_shapes, longitude, latitude)
+    return _get_shape_("zipcodes", zipcode_shapes, longitude, latitude)
 
 
-parcel_strtree = {"value": None, "geoms": {}}
+# "layer name": {"shapes": list the index was built from, "value": STRtree over the shapes,
+# "codes": category code of each shape, "categories": distinct values in order of first appearance,
+# "extent" and "hull": see _get_extent_}
+shape_strtrees = {}
 
 
-def get_address(longitude, latitude, max_distance=0.0001):
-    # load address index the first time you call this method
+# Guards rebuilding an entry of shape_strtrees, and swapping in a reloaded layer with its entry
+_shape_lock_ = threading.Lock()
+
+
+def _build_shape_strtree_(shapes):
+    categories = []
+    category_codes = {}
+    codes = []
+    for shape, value in shapes:
+        if value not in category_codes:
+            category_codes[value] = len(categories)
+            categories.append(value)
+        codes.append(category_codes[value])
+    geoms = [shape for shape, value in shapes]
+    shapely.prepare(geoms)
+    extent, hull = _get_extent_(shapely.bounds(geoms))
+    return {
+        "shapes": shapes,
+        "value": STRtree(geoms),
+        "codes": np.array(codes, dtype=np.int32),
+        "categories": categories,
+        "extent": extent,
+        "hull": hull,
+    }
+
+
+def _get_shape_strtree_(name, shapes):
+    shape_strtree = shape_strtrees.get(name)
+    if shape_strtree is not None and shape_strtree["shapes"] is shapes:
+        return shape_strtree
+    with _shape_lock_:
+        shape_strtree = shape_strtrees.get(name)
+        # (re)build the index the first time it is needed or if the layer's shapes were replaced.  A lookup that
+        # started before a reload swapped in new shapes uses the new index, instead of rebuilding the old one.
+        if shape_strtree is None or (
+            shape_strtree["shapes"] is not shapes
+            and shapes is globals()[geojson_layers[name][0]]
+        ):
+            shape_strtree = _build_shape_strtree_(shapes)
+            shape_strtrees[name] = shape_strtree
+    return shape_strtree
+
+
+# Description
+# - Converts an array of category codes into a list of values, with None where the code is -1
+def _decode_(codes, categories):
+    return [categories[code] if code >= 0 else None for code in codes.tolist()]
+
+
+# Description
+# - Returns the value of the shape that contains each of the input points
+# Accepts
+# - name: the name of the layer, used to cache its index in shape_strtrees
+# - shapes: list of (shape, value) tuples
+# - longitudes, latitudes: sequences or arrays of coordinates (can be raw numbers or strings)
+# - codes: whether to return category codes instead of values
+# Returns
+# - values (list): the value for each point, None if no shape contains it
+# - or, if codes is True, (codes, categories): an int32 array of indices into the categories list, -1 for misses
+def _get_shapes_(name, shapes, longitudes, latitudes, codes=False):
+    shape_strtree = _get_shape_strtree_(name, shapes)
+    longitudes = np.asarray(longitudes, dtype=float)
+    latitudes = np.asarray(latitudes, dtype=float)
+    rows = np.flatnonzero(_inside_(name, shape_strtree, longitudes, latitudes))
+    # find candidate shapes by bounding box, then test containment against the prepared shapes
+    point_indices, shape_indices = shape_strtree["value"].query(
+        shapely.points(longitudes[rows], latitudes[rows])
+    )
+    point_indices = rows[point_indices]
+    contained = shapely.contains_xy(
+        shape_strtree["value"].geometries.take(shape_indices),
+        longitudes[point_indices],
+        latitudes[point_indices],
+    )
+    point_indices = point_indices[contained]
+    shape_indices = shape_indices[contained]
+    # Like _get_shape_, if a point is in more than one shape, use the first shape in the list
+    order = np.lexsort((shape_indices, point_indices))
+    point_indices, first = np.unique(point_indices[order], return_index=True)
+    result = np.full(len(longitudes), -1, dtype=np.int32)
+    result[point_indices] = shape_strtree["codes"][shape_indices[order][first]]
+    if codes:
+        return result, shape_strtree["categories"]
+    return _decode_(result, shape_strtree["categories"])
+
+
+# Batch versions of the lookups above. Each accepts sequences or arrays of longitudes and latitudes
+# and returns a list of values, or (codes, categories) if codes=True.
+def get_city_council_districts(longitudes, latitudes, date=None, codes=False):
+    name, shapes = _get_city_council_districts_layer_(date)
+    return _get_shapes_(name, shapes, longitudes, latitudes, codes=codes)
+
+
+def get_municipalities(longitudes, latitudes, codes=False):
+    return _get_shapes_(
+        "municipalities", municipality_shapes, longitudes, latitudes, codes=codes
+    )
+
+
+def get_zipcodes(longitudes, latitudes, codes=False):
+    return _get_shapes_("zipcodes", zipcode_shapes, longitudes, latitudes, codes=codes)
+
+
+# Description
+# - Checks raw coordinates with array operations, flagging the common problems before any lookup
+# Accepts
+# - longitudes, latitudes: sequences or arrays of coordinates (can be raw numbers or strings)
+# Returns
+# - flags (dict of boolean arrays):
+#   "valid": the point is in Hamilton County (inside the convex hull of the municipalities)
+#   "zero": the point is (0, 0), a common placeholder for a missing location
+#   "swapped": the point would be in Hamilton County with its longitude and latitude swapped
+#   "outside": any other point that isn't valid, including NaN
+def validate_coordinates(longitudes, latitudes):
+    county = _get_shape_strtree_("municipalities", municipality_shapes)
+    x = np.asarray(longitudes, dtype=float)
+    y = np.asarray(latitudes, dtype=float)
+    valid = _inside_(None, county, x, y)
+    zero = (x == 0) & (y == 0)
+    swapped = ~valid & _inside_(None, county, y, x)
+    return {
+        "valid": valid,
+        "zero": zero,
+        "swapped": swapped,
+        "outside": ~(valid | zero | swapped),
+    }
+
+
+# "value" is reference to STRTree, "geoms" matches parcel boundary with address,
+# "addresses" lists the addresses in the same order as the geometries in the tree,
+# "shared" is the memory-mapped parcel index in use, if any (see use_shared_index),
+# "quantized" is the integer parcel storage in use, if any (see use_quantized_storage) - a shared index or
+# quantized storage is also "value", as it is its own index,
+# "extent" and "hull": see _get_extent_
+parcel_strtree = {
+    "value": None,
+    "geoms": {},
+    "addresses": [],
+    "shared": None,
+    "quantized": None,
+}
+
+# Held while parcel data is being built, so the lazy first load and reload() don't race
+_parcel_lock_ = threading.Lock()
+
+
+# Description
+# - Reads a live parcels file
+# Accepts
+# - path (str): the csv.gz file with ADDRESS and geometry columns
+# - with_geoms (bool): whether to also parse the geometries for the parcel STRtree
+# Returns
+# - parcels (dict): address -> WKT geometry
+# - geoms (dict): shapely geometry -> address (empty unless with_geoms is True)
+def _read_parcels_(path, with_geoms=False):
+    parcels = {}
+    geoms = {}
+    with gzip.open(path, "rt", newline="") as f:
+        for row in csv.DictReader(f):
+            if row["ADDRESS"]:
+                parcels[row["ADDRESS"]] = row["geometry"]
+                if with_geoms:
+                    geoms[from_wkt(row["geometry"])] = row["ADDRESS"]
+    return parcels, geoms
+
+
+def _build_parcel_strtree_(geoms):
+    extent, hull = _get_extent_(shapely.bounds(list(geoms)))
+    return {
+        "value": STRtree(list(geoms)),
+        "geoms": geoms,
+        "addresses": list(geoms.values()),
+        "shared": None,
+        "quantized": None,
+        "extent": extent,
+        "hull": hull,
+    }
+
+
+# Description
+# - Returns the current parcel index, loading it the first time it is needed
+# Note
+# - callers should keep the returned reference for the whole lookup, so a concurrent reload can't mix old and new data
+def _load_parcel_strtree_():
+    global parcel_strtree
     if parcel_strtree["value"] is None:
-        with gzip.open(
-            os.path.join(directory, "live_parcels.csv.gz"), "rt", newline=""
-        ) as f:
-            for row in csv.DictReader(f):
-                geom = from_wkt(row["geometry"])
-                if row["ADDRESS"]:
-                    parcel_strtree["geoms"][geom] = row["ADDRESS"]
-            parcel_strtree["value"] = STRtree(
-                [geom for geom, address in parcel_strtree["geoms"].items()]
+        with _parcel_lock_:
+            # check again, in case another thread loaded it while this one waited for the lock
+            if parcel_strtree["value"] is not None:
+                return parcel_strtree
+            _, geoms = _read_parcels_(
+                os.path.join(directory, "live_parcels.csv.gz"), with_geoms=True
             )
+            parcel_strtree = _build_parcel_strtree_(geoms)
+    return parcel_strtree
+
+
+# Description
+# - Returns the geometries of the parcels at the given positions in the parcel STRtree
+def _parcel_geometries_(strtree, indices):
+    if strtree["shared"] is not None:
+        return strtree["shared"].geometries(indices)
+    if strtree["quantized"] is not None:
+        return strtree["quantized"].geometries(indices)
+    return strtree["value"].geometries.take(indices)
+
+
+# Description
+# - Finds the nearest parcel within max_distance of each point
+# Returns
+# - point_indices, parcel_indices: arrays pairing points with parcels, with the nearest parcel first for each point
+def _query_nearest_parcels_(strtree, points, max_distance):
+    if strtree["quantized"] is not None:
+        return _query_nearest_quantized_parcels_(strtree, points, max_distance)
+    if strtree["shared"] is None:
+        return strtree["value"].query_nearest(points, max_distance=max_distance)
+
+    # the grid of the shared index holds bounding boxes, so measure the parcels whose boxes are close enough
+    longitudes, latitudes = shapely.get_coordinates(points).T
+    point_indices, parcel_indices = strtree["shared"].grid.query_boxes(
+        longitudes - max_distance,
+        latitudes - max_distance,
+        longitudes + max_distance,
+        latitudes + max_distance,
+    )
+    rows, inverse = np.unique(parcel_indices, return_inverse=True)
+    distances = shapely.distance(
+        strtree["shared"].geometries(rows)[inverse], points[point_indices]
+    )
+    within = distances <= max_distance
+    point_indices = point_indices[within]
+    parcel_indices = parcel_indices[within]
+    order = np.lexsort((distances[within], point_indices))
+    return point_indices[order], parcel_indices[order]
+
+
+def get_address(longitude, latitude, max_distance=0.0001):
+    strtree = _load_parcel_strtree_()
+    longitude = float(longitude)
+    latitude = float(latitude)
+    # skip the nearest neighbor search for points that can't be near any parcel
+    if _reject_("parcels", strtree, longitude, latitude, max_distance):
+        return None
+    if strtree["shared"] is not None:
+        return _get_shared_address_(strtree, longitude, latitude, max_distance)
+    if strtree["quantized"] is not None:
+        return _get_quantized_address_(strtree, longitude, latitude, max_distance)
 
     point = Point(longitude, latitude)
-    index = parcel_strtree["value"].nearest(point)
-    nearest_geom = parcel_strtree["value"].geometries.take(index)
+    index = strtree["value"].nearest(point)
+    nearest_geom = strtree["value"].geometries.take(index)
     if point.distance(nearest_geom) <= max_distance:
-        return parcel_strtree["geoms"][nearest_geom]
+        return strtree["geoms"][nearest_geom]
+
+
+# Approximate length of one degree of latitude in meters
+METERS_PER_DEGREE = 111_320
+
+# Largest radius (in meters) searched when only k is given - wider than all of Hamilton County
+MAX_SEARCH_RADIUS = 200_000
+
+
+# Description
+# - Returns the meters per degree of longitude and latitude at the given latitude.
+#   This is a local equirectangular approximation, which is accurate to well under
+#   a percent over the few kilometers that a radius query covers.
+def _meters_per_degree_(latitude):
+    return METERS_PER_DEGREE * math.cos(math.radians(latitude)), METERS_PER_DEGREE
+
+
+# Description
+# - Returns the distances in meters from a point to each of the input geometries
+# Accepts
+# - geoms: array of shapely geometries in longitude/latitude
+# - longitude, latitude: the point to measure from
+def _distances_in_meters_(geoms, longitude, latitude):
+    scale = _meters_per_degree_(latitude)
+    # project the geometries into a local plane (in meters) centered on the point
+    projected = shapely.transform(
+        geoms, lambda coords: (coords - (longitude, latitude)) * scale
+    )
+    return shapely.distance(projected, Point(0, 0))
+
+
+# Description
+# - Returns the addresses of parcels near a point, sorted from nearest to farthest.
+# Accepts
+# - longitude: the longitude (x-) coordinate of the input point (can be raw number or string)
+# - latitude: the latitude (y-) coordinate of the input point (can be raw number or string)
+# - radius_m: only include parcels within this many meters of the point (optional)
+# - k: only include the k nearest parcels (optional)
+# Returns
+# - addresses (list of tuples): (address, distance in meters) for each parcel - distance is 0 if the point is inside
+# Note
+# - at least one of radius_m and k is required.  If both are given, the k nearest parcels within radius_m are returned.
+def get_addresses_near(longitude, latitude, radius_m=None, k=None):
+    if radius_m is None and k is None:
+        raise ValueError("get_addresses_near requires radius_m, k, or both")
+
+    strtree = _load_parcel_strtree_()
+
+    longitude = float(longitude)
+    latitude = float(latitude)
+    x_scale, y_scale = _meters_per_degree_(latitude)
+
+    # When only k is given, keep doubling the search radius until k parcels are found
+    search_radius = radius_m if radius_m is not None else 100
+    while True:
+        candidates = strtree["value"].query(
+            shapely.box(
+                longitude - search_radius / x_scale,
+                latitude - search_radius / y_scale,
+                longitude + search_radius / x_scale,
+                latitude + search_radius / y_scale,
+            )
+        )
+        distances = _distances_in_meters_(
+            _parcel_geometries_(strtree, candidates), longitude, latitude
+        )
+        within = distances <= search_radius
+        indices = candidates[within]
+        distances = distances[within]
+        if (
+            radius_m is not None
+            or len(indices) >= k
+            or len(candidates) == len(strtree["addresses"])
+            or search_radius >= MAX_SEARCH_RADIUS
+        ):
+            break
+        search_radius *= 2
+
+    order = np.argsort(distances, kind="stable")
+    if k is not None:
+        order = order[:k]
+    return [(strtree["addresses"][indices[i]], float(distances[i])) for i in order]
+
+
+# Description
+# - Batch version of get_address
+# Accepts
+# - longitudes, latitudes: sequences or arrays of coordinates (can be raw numbers or strings)
+# - max_distance: the maximum distance in degrees from a point to its parcel
+# - codes: whether to return parcel codes instead of addresses
+# Returns
+# - addresses (list of str): the address for each point, None if no parcel is within max_distance
+# - or, if codes is True, (codes, addresses): an int32 array of indices into the list of parcel addresses, -1 for misses
+def get_addresses(longitudes, latitudes, max_distance=0.0001, codes=False):
+    strtree = _load_parcel_strtree_()
+
+    longitudes = np.asarray(longitudes, dtype=float)
+    latitudes = np.asarray(latitudes, dtype=float)
+    rows = np.flatnonzero(
+        _inside_("parcels", strtree, longitudes, latitudes, max_distance)
+    )
+    point_indices, parcel_indices = _query_nearest_parcels_(
+        strtree, shapely.points(longitudes[rows], latitudes[rows]), max_distance
+    )
+    # a point equally close to several parcels gets the first one
+    point_indices, first = np.unique(point_indices, return_index=True)
+    point_indices = rows[point_indices]
+    result = np.full(len(longitudes), -1, dtype=np.int32)
+    result[point_indices] = parcel_indices[first]
+    if codes:
+        return result, strtree["addresses"]
+    return _decode_(result, strtree["addresses"])
+
+
+# Width of a cell of a _CellGrid_ in degrees (about 150 to 180 meters)
+GRID_CELL_SIZE = 0.0016
+
+
+# Description
+# - Returns the positions offsets[i]:offsets[i + 1] for each i in indices, one after the other, and how many there
+#   are for each i
+def _ranges_(offsets, indices):
+    starts = offsets[indices]
+    counts = offsets[indices + 1] - starts
+    ends = np.cumsum(counts)
+    positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(
+        starts - (ends - counts), counts
+    )
+    return positions, counts
+
+
+# A grid of cells over the bounding boxes of the parcels, each cell listing the parcels whose boxes overlap it.
+# Only cells with parcels are kept, as sorted cell numbers with the offsets of their parcels, so the whole grid
+# is a few flat arrays (which a shared index file stores, see build_shared_index).
+class _CellGrid_:
+    # Accepts
+    # - xmin, ymin, xmax, ymax: arrays of the bounds of each parcel
+    # - cell_size: the width of a cell, in the units of the bounds
+    # - stored: (origin, shape, cells, cell_offsets, cell_parcels) of a grid that was built before (optional)
+    def __init__(self, xmin, ymin, xmax, ymax, cell_size, stored=None):
+        self.xmin = xmin
+        self.ymin = ymin
+        self.xmax = xmax
+        self.ymax = ymax
+        self.cell_size = cell_size
+        if stored is not None:
+            (
+                self.origin,
+                self.shape,
+                self.cells,
+                self.cell_offsets,
+                self.cell_parcels,
+            ) = stored
+            return
+        cells_x = (self._cell_of_(xmin), self._cell_of_(xmax))
+        cells_y = (self._cell_of_(ymin), self._cell_of_(ymax))
+        self.origin = (int(cells_x[0].min()), int(cells_y[0].min()))
+        self.shape = (
+            int(cells_x[1].max()) - self.origin[0] + 1,
+            int(cells_y[1].max()) - self.origin[1] + 1,
+        )
+        cells, parcel_indices = self._cells_(*cells_x, *cells_y)
+        order = np.argsort(cells, kind="stable")
+        self.cells, cell_starts = np.unique(cells[order], return_index=True)
+        self.cell_offsets = np.append(cell_starts, len(order))
+        self.cell_parcels = parcel_indices[order].astype(np.int32)
+
+    # Returns the column (or row) of the cells that the x (or y) values are in
+    def _cell_of_(self, values):
+        return np.floor_divide(values, self.cell_size).astype(np.int64)
+
+    # Returns the numbers of the grid cells from cell x0 to x1 and y0 to y1 of each box, and the box each is from
+    def _cells_(self, x0, x1, y0, y1):
+        width = x1.astype(np.int64) - x0 + 1
+        counts = width * (y1.astype(np.int64) - y0 + 1)
+        boxes = np.repeat(np.arange(len(counts)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        x = x0[boxes] - self.origin[0] + offsets % width[boxes]
+        y = y0[boxes] - self.origin[1] + offsets // width[boxes]
+        return x * self.shape[1] + y, boxes
+
+    # Returns the pairs of boxes and parcels whose bounding boxes overlap
+    # Returns
+    # - box_indices, parcel_indices: int arrays, sorted by box and then by parcel
+    def query_boxes(self, xmin, ymin, xmax, ymax):
+        cells, boxes = self._cells_(
+            *(
+                np.clip(
+                    self._cell_of_(corner) - self.origin[axis],
+                    0,
+                    self.shape[axis] - 1,
+                )
+                + self.origin[axis]
+                for corner, axis in ((xmin, 0), (xmax, 0), (ymin, 1), (ymax, 1))
+            )
+        )
+        positions = np.searchsorted(self.cells, cells).clip(max=len(self.cells) - 1)
+        occupied = self.cells[positions] == cells
+        parcel_positions, counts = _ranges_(self.cell_offsets, positions[occupied])
+        boxes = np.repeat(boxes[occupied], counts)
+        parcel_indices = self.cell_parcels[parcel_positions]
+        overlaps = (
+            (xmin[boxes] <= self.xmax[parcel_indices])
+            & (xmax[boxes] >= self.xmin[parcel_indices])
+            & (ymin[boxes] <= self.ymax[parcel_indices])
+            & (ymax[boxes] >= self.ymin[parcel_indices])
+        )
+        # a parcel in more than one of a box's cells is listed once
+        pairs = np.unique(boxes[overlaps] * len(self.xmin) + parcel_indices[overlaps])
+        return pairs // len(self.xmin), pairs % len(self.xmin)
+
+    # Like query_boxes, for the box margin around one point
+    # Returns
+    # - parcel_indices: list of int, sorted
+    # - box_distances: list of float, the distance from the point to the bounding box of each parcel, which no part
+    #   of the parcel is closer than
+    def query_point(self, x, y, margin):
+        x0 = max(int((x - margin) // self.cell_size) - self.origin[0], 0)
+        x1 = min(
+            int((x + margin) // self.cell_size) - self.origin[0], self.shape[0] - 1
+        )
+        y0 = max(int((y - margin) // self.cell_size) - self.origin[1], 0)
+        y1 = min(
+            int((y + margin) // self.cell_size) - self.origin[1], self.shape[1] - 1
+        )
+        found = []
+        for cell_x in range(x0, x1 + 1):
+            # the occupied cells of a column are a run of self.cells, and their parcels a run of self.cell_parcels
+            start, end = self.cells.searchsorted(
+                [cell_x * self.shape[1] + y0, cell_x * self.shape[1] + y1 + 1]
+            )
+            if start < end:
+                found.append(
+                    self.cell_parcels[self.cell_offsets[start] : self.cell_offsets[end]]
+                )
+        if not found:
+            return [], []
+        if x0 == x1 and y0 == y1:
+            parcel_indices = found[0]
+        else:
+            # a parcel in more than one of the cells is listed once
+            parcel_indices = np.unique(np.concatenate(found))
+
+        bounds = (
+            self.xmin[parcel_indices],
+            self.ymin[parcel_indices],
+            self.xmax[parcel_indices],
+            self.ymax[parcel_indices],
+        )
+        if len(parcel_indices) > 16:
+            dx = np.maximum(np.maximum(bounds[0] - x, x - bounds[2]), 0)
+            dy = np.maximum(np.maximum(bounds[1] - y, y - bounds[3]), 0)
+            near = (dx <= margin) & (dy <= margin)
+            return (
+                parcel_indices[near].tolist(),
+                np.hypot(dx[near], dy[near]).tolist(),
+            )
+        # a few parcels are measured faster one at a time than with numpy calls on tiny arrays
+        near = []
+        box_distances = []
+        for index, xmin, ymin, xmax, ymax in zip(
+            parcel_indices.tolist(), *(column.tolist() for column in bounds)
+        ):
+            dx = max(xmin - x, x - xmax, 0)
+            dy = max(ymin - y, y - ymax, 0)
+            if dx <= margin and dy <= margin:
+                near.append(index)
+                box_distances.append(math.hypot(dx, dy))
+        return near, box_distances
+
+
+# Description
+# - Returns the nearest candidate parcel within max_distance of a point, or None.  Candidates are measured in order
+#   of the distance to their bounding boxes, until the rest are farther than the nearest so far.  Ties go to the
+#   first parcel, like in the batch lookups.
+# Accepts
+# - candidates, box_distances: parcel indices and the distance to each one's bounding box, from query_point
+# - distance (function): returns the distance from the point to a parcel, given its index
+def _nearest_candidate_(candidates, box_distances, max_distance, distance):
+    nearest = None
+    nearest_distance = max_distance
+    for box_distance, index in sorted(zip(box_distances, candidates)):
+        if box_distance > nearest_distance:
+            break
+        parcel_distance = distance(index)
+        if parcel_distance < nearest_distance or (
+            parcel_distance == nearest_distance and (nearest is None or index < nearest)
+        ):
+            nearest = index
+            nearest_distance = parcel_distance
+    return nearest
+
+
+# Layout of a shared parcel index file (little-endian, with every array 8-byte aligned):
+# - header: SHARED_INDEX_MAGIC, then uint64 row count, address bytes length, WKT bytes length, grid cell count and
+#   grid entry count, then int64 grid origin (2) and shape (2), then float64 grid cell size
+# - bounds: float64 (rows, 4) - xmin, ymin, xmax, ymax of each parcel
+# - grid (see _CellGrid_): int64 cell numbers, int64 cell offsets (cells + 1), then int32 parcel rows, padded to 8 bytes
+# - address offsets, then WKT offsets: uint64 (rows + 1) - row i is bytes[offsets[i]:offsets[i + 1]]
+# - address bytes, then WKT bytes: UTF-8
+# Rows are sorted by address, so an address is found with a binary search
+SHARED_INDEX_MAGIC = b"GEOCHAT2"
+
+
+# Description
+# - Writes the parcels to a shared index file that many processes can memory-map (see use_shared_index)
+# Accepts
+# - path (str): where to write the index - it is written to a temporary file first, then moved into place
+# - parcels_path (str): the live parcels csv.gz file (optional - defaults to the file packaged with geochatt)
+def build_shared_index(path, parcels_path=None):
+    rows = []
+    with gzip.open(
+        parcels_path or os.path.join(directory, "live_parcels.csv.gz"), "rt", newline=""
+    ) as f:
+        for row in csv.DictReader(f):
+            if row["ADDRESS"]:
+                rows.append(
+                    (row["ADDRESS"].encode("utf-8"), row["geometry"].encode("utf-8"))
+                )
+    # a stable sort keeps duplicate addresses in file order, so the last one wins like in the parcels dict
+    rows.sort(key=lambda row: row[0])
+
+    bounds = shapely.bounds(from_wkt([wkt for address, wkt in rows]))
+    grid = _CellGrid_(*bounds.T, GRID_CELL_SIZE)
+    address_offsets = np.zeros(len(rows) + 1, dtype="<u8")
+    np.cumsum([len(address) for address, wkt in rows], out=address_offsets[1:])
+    wkt_offsets = np.zeros(len(rows) + 1, dtype="<u8")
+    np.cumsum([len(wkt) for address, wkt in rows], out=wkt_offsets[1:])
+    header = (
+        np.array(
+            [
+                len(rows),
+                address_offsets[-1],
+                wkt_offsets[-1],
+                len(grid.cells),
+                len(grid.cell_parcels),
+            ],
+            dtype="<u8",
+        ).tobytes()
+        + np.array([*grid.origin, *grid.shape], dtype="<i8").tobytes()
+        + np.array([grid.cell_size], dtype="<f8").tobytes()
+    )
+
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(SHARED_INDEX_MAGIC)
+        f.write(header)
+        f.write(bounds.astype("<f8").tobytes())
+        f.write(grid.cells.astype("<i8").tobytes())
+        f.write(grid.cell_offsets.astype("<i8").tobytes())
+        f.write(grid.cell_parcels.astype("<i4").tobytes())
+        f.write(bytes(-len(grid.cell_parcels) * 4 % 8))
+        f.write(address_offsets.tobytes())
+        f.write(wkt_offsets.tobytes())
+        for address, wkt in rows:
+            f.write(address)
+        for address, wkt in rows:
+            f.write(wkt)
+    os.replace(temporary_path, path)
+
+
+# A read-only column of strings in a shared index - strings are only created when accessed
+class _SharedColumn_(Sequence):
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, index):
+        return bytes(self.data[self.offsets[index] : self.offsets[index + 1]])
+
+    def __getitem__(self, index):
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.raw(index).decode("utf-8")
+
+
+# The parcels of a shared index file, memory-mapped so every process shares one copy of the data.
+# Behaves like the parcels dict (address -> WKT geometry).
+class _SharedParcels_(Mapping):
+    def __init__(self, path):
+        self.path = path
+        # a plain array over the mapping, as np.memmap adds overhead to every operation on its views
+        buffer = np.asarray(np.memmap(path, dtype=np.uint8, mode="r"))
+        if bytes(buffer[:8]) != SHARED_INDEX_MAGIC:
+            raise ValueError(
+                f"{path} is not a geochatt shared index (or is from an older version), write it with build_shared_index"
+            )
+        count, address_length, wkt_length, cell_count, entry_count = (
+            int(n) for n in buffer[8:48].view("<u8")
+        )
+        origin_x, origin_y, shape_x, shape_y = (
+            int(n) for n in buffer[48:80].view("<i8")
+        )
+        cell_size = float(buffer[80:88].view("<f8")[0])
+
+        start = 88
+        self.bounds = buffer[start : start + count * 32].view("<f8").reshape(count, 4)
+        start += count * 32
+        cells = buffer[start : start + cell_count * 8].view("<i8")
+        start += cell_count * 8
+        cell_offsets = buffer[start : start + (cell_count + 1) * 8].view("<i8")
+        start += (cell_count + 1) * 8
+        cell_parcels = buffer[start : start + entry_count * 4].view("<i4")
+        start += entry_count * 4 + (-entry_count * 4 % 8)
+        self.grid = _CellGrid_(
+            *self.bounds.T,
+            cell_size,
+            stored=(
+                (origin_x, origin_y),
+                (shape_x, shape_y),
+                cells,
+                cell_offsets,
+                cell_parcels,
+            ),
+        )
+        address_offsets = buffer[start : start + (count + 1) * 8].view("<u8")
+        start += (count + 1) * 8
+        wkt_offsets = buffer[start : start + (count + 1) * 8].view("<u8")
+        start += (count + 1) * 8
+        self.addresses = _SharedColumn_(
+            address_offsets, buffer[start : start + address_length]
+        )
+        start += address_length
+        self.wkts = _SharedColumn_(wkt_offsets, buffer[start : start + wkt_length])
+        self._length_ = None
+
+    # Returns the row of the address (the last one if it appears more than once), or -1
+    def find(self, address):
+        target = address.encode("utf-8")
+        low, high = 0, len(self.addresses)
+        while low < high:
+            middle = (low + high) // 2
+            if target < self.addresses.raw(middle):
+                high = middle
+            else:
+                low = middle + 1
+        if low > 0 and self.addresses.raw(low - 1) == target:
+            return low - 1
+        return -1
+
+    def geometries(self, indices):
+        return from_wkt([self.wkts[index] for index in indices])
+
+    # Returns the rows whose bounding boxes overlap the bounding box of the geometry, like STRtree.query
+    def query(self, geometry):
+        if shapely.is_empty(geometry):
+            return np.array([], dtype=np.intp)
+        return self.grid.query_boxes(
+            *(np.array([value]) for value in shapely.bounds(geometry))
+        )[1]
+
+    def __getitem__(self, address):
+        index = self.find(address)
+        if index < 0:
+            raise KeyError(address)
+        return self.wkts[index]
+
+    def __iter__(self):
+        for index in range(len(self.addresses)):
+            # skip all but the last row of a duplicated address
+            if index + 1 == len(self.addresses) or self.addresses.raw(
+                index
+            ) != self.addresses.raw(index + 1):
+                yield self.addresses[index]
+
+    def __len__(self):
+        if self._length_ is None:
+            self._length_ = sum(1 for address in self)
+        return self._length_
+
+
+# Description
+# - Like get_address, for a shared index.  Only the parcels near the point are parsed, nearest bounding box first.
+def _get_shared_address_(strtree, longitude, latitude, max_distance):
+    shared = strtree["shared"]
+    candidates, box_distances = shared.grid.query_point(
+        longitude, latitude, max_distance
+    )
+    if not candidates:
+        return None
+    point = Point(longitude, latitude)
+    nearest = _nearest_candidate_(
+        candidates,
+        box_distances,
+        max_distance,
+        lambda index: point.distance(from_wkt(shared.wkts[index])),
+    )
+    if nearest is not None:
+        return strtree["addresses"][nearest]
+
+
+# Description
+# - Switches parcel lookups to a memory-mapped shared index file, building it first if it doesn't exist.
+#   Processes that use the same file share one copy of the parcel data through the operating system's page cache,
+#   so memory stays flat as the number of workers grows.  Geometries and strings are only created for the rows a
+#   lookup touches.  Setting the GEOCHATT_SHARED_INDEX environment variable to a path does this at import time.
+# Accepts
+# - path (str): the shared index file, written by build_shared_index
+# Note
+# - to pick up new parcels, build a new index file and call use_shared_index again
+def use_shared_index(path):
+    global parcels, parcel_strtree, address_index
+    if not os.path.exists(path):
+        build_shared_index(path)
+    shared = _SharedParcels_(path)
+    # the grid in the file is the index, so the only per-process data is the extent and hull
+    extent, hull = _get_extent_(shared.bounds)
+    with _parcel_lock_:
+        parcel_strtree = {
+            "value": shared,
+            "geoms": None,
+            "addresses": shared.addresses,
+            "shared": shared,
+            "quantized": None,
+            "extent": extent,
+            "hull": hull,
+        }
+        parcels = shared
+        # the rows of a shared index are already sorted, so they serve as the index for suggest_addresses
+        address_index = {"parcels": shared, "value": shared.addresses}
+
+
+# Quantized coordinates are int32 offsets from this point (longitude, latitude), southwest of Hamilton County
+QUANTIZED_ORIGIN = (-85.7, 34.9)
+
+# Size of one quantized step in degrees (about 1 cm) - the source WKT has 7 decimal places, so nothing is lost
+QUANTIZED_RESOLUTION = 1e-7
+
+# Width of a cell of the grid that indexes quantized parcels, in steps
+QUANTIZED_CELL_SIZE = round(GRID_CELL_SIZE / QUANTIZED_RESOLUTION)
+
+
+# Description
+# - Converts longitudes and latitudes to quantized coordinates
+# Returns
+# - x, y: int32 arrays of steps of QUANTIZED_RESOLUTION from QUANTIZED_ORIGIN
+def _quantize_(longitudes, latitudes):
+    x = np.rint((np.asarray(longitudes) - QUANTIZED_ORIGIN[0]) / QUANTIZED_RESOLUTION)
+    y = np.rint((np.asarray(latitudes) - QUANTIZED_ORIGIN[1]) / QUANTIZED_RESOLUTION)
+    return x.astype(np.int32), y.astype(np.int32)
+
+
+# The parcels of a live parcels file with their coordinates stored as int32 (see _quantize_),
+# in the ragged layout of shapely.to_ragged_array.  Behaves like the parcels dict (address -> WKT geometry).
+class _QuantizedParcels_(Mapping):
+    def __init__(self, path):
+        self.path = path
+        addresses = []
+        wkts = []
+        with gzip.open(path, "rt", newline="") as f:
+            for row in csv.DictReader(f):
+                if row["ADDRESS"]:
+                    addresses.append(row["ADDRESS"])
+                    wkts.append(row["geometry"])
+        # each step is dropped once the next is built, to keep the memory used while loading down
+        geoms = from_wkt(wkts)
+        del wkts
+
+        self.multi = shapely.get_type_id(geoms) == shapely.GeometryType.MULTIPOLYGON
+        geometry_type, coords, offsets = shapely.to_ragged_array(geoms)
+        del geoms
+        if geometry_type == shapely.GeometryType.POLYGON:
+            # every parcel is a polygon, so each is its own part
+            offsets = (*offsets, np.arange(len(self.multi) + 1, dtype=np.int32))
+        self.ring_offsets, self.polygon_offsets, self.parcel_offsets = offsets
+        self.x, self.y = _quantize_(coords[:, 0], coords[:, 1])
+        del coords
+
+        # each parcel's vertices are contiguous, and an edge joins every vertex to the next except the last of a ring
+        self.vertex_offsets = self.ring_offsets[
+            self.polygon_offsets[self.parcel_offsets]
+        ]
+        self.ring_ends = np.zeros(len(self.x), dtype=bool)
+        self.ring_ends[self.ring_offsets[1:] - 1] = True
+        starts = self.vertex_offsets[:-1]
+        self.xmin = np.minimum.reduceat(self.x, starts)
+        self.ymin = np.minimum.reduceat(self.y, starts)
+        self.xmax = np.maximum.reduceat(self.x, starts)
+        self.ymax = np.maximum.reduceat(self.y, starts)
+
+        self.grid = _CellGrid_(
+            self.xmin, self.ymin, self.xmax, self.ymax, QUANTIZED_CELL_SIZE
+        )
+
+        self.addresses = addresses
+        # like the parcels dict, the last parcel with an address wins
+        self.rows = {address: index for index, address in enumerate(addresses)}
+
+    # xmin, ymin, xmax, ymax of each parcel in degrees
+    @property
+    def bounds(self):
+        return np.column_stack(
+            (
+                self.xmin * QUANTIZED_RESOLUTION + QUANTIZED_ORIGIN[0],
+                self.ymin * QUANTIZED_RESOLUTION + QUANTIZED_ORIGIN[1],
+                self.xmax * QUANTIZED_RESOLUTION + QUANTIZED_ORIGIN[0],
+                self.ymax * QUANTIZED_RESOLUTION + QUANTIZED_ORIGIN[1],
+            )
+        )
+
+    # Returns the parcels whose bounding boxes overlap the bounding box of the geometry, like STRtree.query
+    def query(self, geometry):
+        if shapely.is_empty(geometry):
+            return np.array([], dtype=np.intp)
+        xmin, ymin, xmax, ymax = shapely.bounds(geometry)
+        x0, y0 = _quantize_([xmin], [ymin])
+        x1, y1 = _quantize_([xmax], [ymax])
+        return self.grid.query_boxes(x0 - 1, y0 - 1, x1 + 1, y1 + 1)[1]
+
+    # Returns whether each quantized point is inside the bounding box of its parcel
+    def in_bounds(self, indices, x, y):
+        return (
+            (x >= self.xmin[indices])
+            & (x <= self.xmax[indices])
+            & (y >= self.ymin[indices])
+            & (y <= self.ymax[indices])
+        )
+
+    # Returns whether each edge, from (x1, y1) to (x2, y2), crosses the ray going right from its point.
+    # The edge crosses if it straddles the point's y and the point is left of it, which is compared with
+    # exact integer products instead of dividing.
+    @staticmethod
+    def _crosses_(x1, y1, x2, y2, px, py):
+        x1, y1, x2, y2 = (np.asarray(c, dtype=np.int64) for c in (x1, y1, x2, y2))
+        left = (px - x1) * (y2 - y1)
+        right = (py - y1) * (x2 - x1)
+        return ((y1 > py) != (y2 > py)) & np.where(y2 > y1, left < right, left > right)
+
+    # Returns whether each quantized point is inside its parcel, counting the rings its ray crosses.
+    # Holes and the parts of a multipolygon are all rings, so an odd count is inside.
+    def contains(self, indices, x, y):
+        vertices, counts = _ranges_(self.vertex_offsets, np.asarray(indices))
+        pairs = np.repeat(np.arange(len(counts)), counts)
+        edge = ~self.ring_ends[vertices]
+        vertices = vertices[edge]
+        pairs = pairs[edge]
+        crosses = self._crosses_(
+            self.x[vertices],
+            self.y[vertices],
+            self.x[vertices + 1],
+            self.y[vertices + 1],
+            np.asarray(x, dtype=np.int64)[pairs],
+            np.asarray(y, dtype=np.int64)[pairs],
+        )
+        return np.bincount(pairs[crosses], minlength=len(counts)) % 2 == 1
+
+    # Returns the distance from a point to one parcel, in steps of QUANTIZED_RESOLUTION - 0 if the point, rounded
+    # onto the integer grid, is inside (like contains).  The point doesn't have to be on the integer grid.
+    # A single lookup only measures a few parcels of a few vertices each, so this loops over the edges in Python,
+    # which is several times faster than the dozens of numpy calls on tiny arrays it would take otherwise.
+    def distance_to_point(self, index, x, y):
+        # the parcel's vertices are contiguous, so its edges join each vertex to the next, except at ring ends
+        start = self.vertex_offsets[index]
+        end = self.vertex_offsets[index + 1]
+        xs = self.x[start:end].tolist()
+        ys = self.y[start:end].tolist()
+        ring_ends = self.ring_ends[start:end].tolist()
+        px = round(x)
+        py = round(y)
+        inside = False
+        nearest = math.inf
+        for i in range(len(xs) - 1):
+            if ring_ends[i]:
+                continue
+            x1, y1, x2, y2 = xs[i], ys[i], xs[i + 1], ys[i + 1]
+            # the crossing test of _crosses_, on exact Python ints
+            if (y1 > py) != (y2 > py):
+                left = (px - x1) * (y2 - y1)
+                right = (py - y1) * (x2 - x1)
+                if left < right if y2 > y1 else left > right:
+                    inside = not inside
+            # the point of the edge nearest to the point - an edge of one repeated vertex has t = 0
+            dx = x2 - x1
+            dy = y2 - y1
+            t = min(
+                max(((x - x1) * dx + (y - y1) * dy) / max(dx * dx + dy * dy, 1), 0), 1
+            )
+            nearest = min(nearest, math.hypot(x1 + t * dx - x, y1 + t * dy - y))
+        return 0.0 if inside else nearest
+
+    def geometries(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) == 0:
+            return np.array([], dtype=object)
+        polygons, polygon_counts = _ranges_(self.parcel_offsets, indices)
+        rings, ring_counts = _ranges_(self.polygon_offsets, polygons)
+        vertices, vertex_counts = _ranges_(self.ring_offsets, rings)
+        coords = np.column_stack(
+            (
+                self.x[vertices] * QUANTIZED_RESOLUTION + QUANTIZED_ORIGIN[0],
+                self.y[vertices] * QUANTIZED_RESOLUTION + QUANTIZED_ORIGIN[1],
+            )
+        )
+        geoms = shapely.from_ragged_array(
+            shapely.GeometryType.MULTIPOLYGON,
+            coords,
+            tuple(
+                np.concatenate(([0], np.cumsum(counts)))
+                for counts in (vertex_counts, ring_counts, polygon_counts)
+            ),
+        )
+        single = ~self.multi[indices]
+        geoms[single] = shapely.get_geometry(geoms[single], 0)
+        return geoms
+
+    def __getitem__(self, address):
+        geom = self.geometries([self.rows[address]])[0]
+        return shapely.to_wkt(geom, rounding_precision=7, trim=False)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def _build_quantized_strtree_(quantized):
+    extent, hull = _get_extent_(quantized.bounds)
+    return {
+        "value": quantized,
+        "geoms": None,
+        "addresses": quantized.addresses,
+        "shared": None,
+        "quantized": quantized,
+        "extent": extent,
+        "hull": hull,
+    }
+
+
+# Description
+# - Like _query_nearest_parcels_, for quantized parcels.  Points are tested against the parcels around them on the
+#   integer coordinates, and only points outside every parcel are measured with shapely.
+def _query_nearest_quantized_parcels_(strtree, points, max_distance):
+    quantized = strtree["quantized"]
+    x, y = _quantize_(*shapely.get_coordinates(points).T)
+    margin = math.ceil(max_distance / QUANTIZED_RESOLUTION)
+    point_indices, parcel_indices = quantized.grid.query_boxes(
+        x - margin, y - margin, x + margin, y + margin
+    )
+    x = x[point_indices]
+    y = y[point_indices]
+    inside = np.zeros(len(point_indices), dtype=bool)
+    boxed = np.flatnonzero(quantized.in_bounds(parcel_indices, x, y))
+    inside[boxed] = quantized.contains(parcel_indices[boxed], x[boxed], y[boxed])
+
+    found = np.zeros(len(points), dtype=bool)
+    found[point_indices[inside]] = True
+    outside = ~found[point_indices]
+    distances = np.zeros(len(point_indices))
+    rows, inverse = np.unique(parcel_indices[outside], return_inverse=True)
+    distances[outside] = shapely.distance(
+        quantized.geometries(rows)[inverse], points[point_indices[outside]]
+    )
+    keep = inside | (outside & (distances <= max_distance))
+    point_indices = point_indices[keep]
+    parcel_indices = parcel_indices[keep]
+    order = np.lexsort((parcel_indices, distances[keep], point_indices))
+    return point_indices[order], parcel_indices[order]
+
+
+# Description
+# - Like get_address, for quantized parcels
+def _get_quantized_address_(strtree, longitude, latitude, max_distance):
+    quantized = strtree["quantized"]
+    # the point in steps of QUANTIZED_RESOLUTION - parcels are measured on their integer coordinates, so no
+    # shapely geometries are built
+    x = (longitude - QUANTIZED_ORIGIN[0]) / QUANTIZED_RESOLUTION
+    y = (latitude - QUANTIZED_ORIGIN[1]) / QUANTIZED_RESOLUTION
+    margin = max_distance / QUANTIZED_RESOLUTION
+    nearest = _nearest_candidate_(
+        *quantized.grid.query_point(x, y, margin),
+        margin,
+        lambda index: quantized.distance_to_point(index, x, y),
+    )
+    if nearest is not None:
+        return strtree["addresses"][nearest]
+
+
+# Description
+# - Switches parcel lookups to quantized storage: coordinates are kept as int32 steps of QUANTIZED_RESOLUTION
+#   instead of shapely geometries and WKT strings, which takes about half the memory.  Lookups filter and test
+#   points against parcels on the integer coordinates, and only build shapely geometries for exact distances in
+#   batches and for output (get_parcel regenerates the WKT with 7 decimal places).  Setting the GEOCHATT_QUANTIZED
+#   environment variable to 1 does this at import time.
+# Accepts
+# - path (str): the live parcels csv.gz file (optional - defaults to the file packaged with geochatt)
+# Note
+# - reload("parcels") keeps quantized storage, but diffs can't be applied to it
+def use_quantized_storage(path=None):
+    global parcels, parcel_strtree, address_index
+    quantized = _QuantizedParcels_(
+        path or os.path.join(directory, "live_parcels.csv.gz")
+    )
+    new_strtree = _build_quantized_strtree_(quantized)
+    new_address_index = {"parcels": quantized, "value": sorted(quantized)}
+    with _parcel_lock_:
+        parcel_strtree = new_strtree
+        parcels = quantized
+        address_index = new_address_index
+
+
+# Description
+# - Switches parcel lookups back to the default storage (the parcels dict and an STRtree of shapely geometries),
+#   from a shared index or quantized storage
+# Accepts
+# - path (str): the live parcels csv.gz file (optional - defaults to the file packaged with geochatt)
+def use_default_storage(path=None):
+    global parcels, parcel_strtree, address_index
+    new_parcels, geoms = _read_parcels_(
+        path or os.path.join(directory, "live_parcels.csv.gz"), with_geoms=True
+    )
+    new_strtree = _build_parcel_strtree_(geoms)
+    new_address_index = {"parcels": new_parcels, "value": sorted(new_parcels)}
+    with _parcel_lock_:
+        parcel_strtree = new_strtree
+        parcels = new_parcels
+        address_index = new_address_index
 
 
 # Create Dict that has addresses as keys and parcels as values
-parcels = {}
-with gzip.open(os.path.join(directory, "live_parcels.csv.gz"), "rt", newline="") as f:
-    # Get address, parcel from each row and put them in Dict as key, value
-    for row in csv.DictReader(f):
-        if row["ADDRESS"]:
-            parcels[row["ADDRESS"]] = row["geometry"]
+if os.environ.get("GEOCHATT_SHARED_INDEX"):
+    use_shared_index(os.environ["GEOCHATT_SHARED_INDEX"])
+elif os.environ.get("GEOCHATT_QUANTIZED"):
+    use_quantized_storage()
+else:
+    parcels, _ = _read_parcels_(os.path.join(directory, "live_parcels.csv.gz"))
 
 # Create dictionary of cardinal directions that may appear in addresses with their abbreviations
 cardinal_directions = {
@@ -334,12 +1516,12 @@ street_suffixes = {
 
 
 # Description
-# - Returns the geometry of the parcel associated with a given address.
+# - Returns the ways an address may be written in the parcels data, from the address as input
 # Accepts
 # - address: str
 # Returns
-# - parcel: str
-def get_parcel(address):
+# - acceptable: list of str - the uppercased input, then the input with its direction and suffix abbreviated
+def _normalize_address_(address):
     # Convert input to uppercase
     check_addr = address.upper()
     # Make a list of acceptable address strings - ["EAST 11TH STREET", "E 11TH STREET"], for example
@@ -362,17 +1544,29 @@ def get_parcel(address):
     normalized = dir_normalized
     split_by_word = normalized.split()
     for suffix, shorthand in street_suffixes.items():
-        if split_by_word[-1] == suffix:
+        if split_by_word and split_by_word[-1] == suffix:
             # Replace the full suffix with the shorthand version (Ex: "DRIVE" -> "DR")
             normalized = dir_normalized.replace(suffix, shorthand, 1)
     # Append the normalized address string to the "acceptable" list
     acceptable.append(normalized)
     # For debugging: print("ACCEPTABLE LIST: ", acceptable)
+    return acceptable
+
+
+# Description
+# - Returns the geometry of the parcel associated with a given address.
+# Accepts
+# - address: str
+# Returns
+# - parcel: str
+def get_parcel(address):
+    acceptable = _normalize_address_(address)
     # Grab the parcel associated with address from "parcels" Dict
     # print(acceptable)
+    current = parcels
     for addr in acceptable:
-        if addr in parcels:
-            return parcels[addr]
+        if addr in current:
+            return current[addr]
 
 
 # Description
@@ -390,10 +1584,108 @@ def get_parcel_centroid(address):
     return polygon.centroid
 
 
+# Description
+# - Returns an index for suggest_addresses: "parcels" is the parcels it was built from, and "value" is their
+#   addresses in sorted order
+def _build_address_index_(parcels):
+    if isinstance(parcels, _SharedParcels_):
+        # the rows of a shared index are already sorted by address
+        return {"parcels": parcels, "value": parcels.addresses}
+    return {"parcels": parcels, "value": sorted(parcels)}
+
+
+address_index = _build_address_index_(parcels)
+
+
+# Description
+# - Returns the parcel addresses that start with the input, for autocomplete.  Directions and suffixes are
+#   abbreviated like in get_parcel, so "101 EAST 11" matches "101 E 11TH ST".
+# Accepts
+# - prefix: str; the start of an address
+# - limit: int; the maximum number of suggestions
+# Returns
+# - addresses: list of str, in alphabetical order
+def suggest_addresses(prefix, limit=10):
+    global address_index
+    index = address_index
+    # the storage functions and reload swap the index along with parcels, so this only happens when parcels was
+    # assigned directly - rebuild the index once and keep it for the next call
+    if index["parcels"] is not parcels:
+        index = _build_address_index_(parcels)
+        address_index = index
+
+    addresses = index["value"]
+    prefix = prefix.lstrip()
+    # the last word may be partly typed, so also try the directions and suffixes it can become, which are
+    # abbreviated in the data ("101 EA" -> "101 E ", "11TH STR" -> "11TH ST")
+    completions = []
+    head, _, last = prefix.upper().rpartition(" ")
+    if head.strip() and last:
+        for word in [*(d.strip() for d in cardinal_directions), *street_suffixes]:
+            if word.startswith(last) and word != last:
+                completions.append(f"{head} {word}")
+
+    starts = _normalize_address_(prefix)
+    # a direction is only abbreviated when a space follows it, so "101 EAST" also tries "101 E "
+    if not prefix.endswith(" "):
+        starts += _normalize_address_(prefix + " ")[1:]
+    # the spelled-out completions already start with the prefix, so only their abbreviations are added
+    for text in completions:
+        starts += _normalize_address_(text)[1:] + _normalize_address_(text + " ")[1:]
+    suggestions = []
+    for start in dict.fromkeys(starts):
+        if not start.strip():
+            continue
+        i = bisect.bisect_left(addresses, start)
+        matches = 0
+        while i < len(addresses) and matches < limit:
+            address = addresses[i]
+            if not address.startswith(start):
+                break
+            # the same address can appear more than once in a shared index
+            if address not in suggestions:
+                suggestions.append(address)
+                matches += 1
+            i += 1
+    return sorted(suggestions)[:limit]
+
+
 # "value" is reference to STRTree, "geoms" matches boundary with name of neighborhood
+# "extent" and "hull": see _get_extent_
 neighborhood_strtree = {"value": None, "geoms": {}}
 
 
+# Description
+# - Reads a neighborhood associations file into a new index like neighborhood_strtree
+# Accepts
+# - path (str): the csv.gz file with name and boundary columns
+def _read_neighborhoods_(path):
+    geoms = {}
+    with gzip.open(path, "rt", newline="", encoding="utf-8") as f:
+        # Fill "geoms" dictionary with data from CSV in the format of "boundary": name
+        for row in csv.DictReader(f):
+            geom = from_wkt(row["boundary"])
+            if row["name"]:
+                geoms[geom] = row["name"]
+    # Create the STRtree and store the reference to it in "value" for later use
+    extent, hull = _get_extent_(shapely.bounds(list(geoms)))
+    return {
+        "value": STRtree(list(geoms)),
+        "geoms": geoms,
+        "extent": extent,
+        "hull": hull,
+    }
+
+
+def _load_neighborhood_strtree_():
+    global neighborhood_strtree
+    if neighborhood_strtree["value"] is None:
+        neighborhood_strtree = _read_neighborhoods_(
+            os.path.join(directory, "neighborhoods.csv.gz")
+        )
+    return neighborhood_strtree
+
+
 # Description
 # - Returns the neighborhood associations that the input coordinates' point is in, if applicable.
 # Accepts
@@ -408,47 +1700,251 @@ def get_neighborhood_associations(longitude=None, latitude=None, parcel=None):
         query_geom = from_wkt(parcel)
     # Else, we just need to make a point out of the input longitude and latitude
     else:
-        query_geom = Point(longitude, latitude)
+        query_geom = Point(float(longitude), float(latitude))
 
     # Load address index for tree upon first run of the function
-    if neighborhood_strtree["value"] is None:
-        with gzip.open(
-            os.path.join(directory, "neighborhoods.csv.gz"),
-            "rt",
-            newline="",
-            encoding="utf-8",
-        ) as f:
-            # Fill "geoms" dictionary with data from CSV in the format of "boundary": name
-            for row in csv.DictReader(f):
-                geom = from_wkt(row["boundary"])
-                if row["name"]:
-                    neighborhood_strtree["geoms"][geom] = row["name"]
-            # Create the STRtree and store the reference to it in "value" for later use
-            neighborhood_strtree["value"] = STRtree(
-                [geom for geom, name in neighborhood_strtree["geoms"].items()]
-            )
+    strtree = _load_neighborhood_strtree_()
+
+    # skip the index for points outside every neighborhood association's extent
+    if parcel is None and _reject_(
+        "neighborhoods", strtree, query_geom.x, query_geom.y
+    ):
+        return []
 
     # Grab index of all geometries (neighborhood associations) that the point intersects
-    neighborhood_indices = neighborhood_strtree["value"].query(
-        query_geom, predicate="intersects"
-    )
+    neighborhood_indices = strtree["value"].query(query_geom, predicate="intersects")
     # Grab actual geometries of neighborhoods intersecting point and store them in list
     neighborhood_geometries = [
-        neighborhood_strtree["value"].geometries[index]
-        for index in neighborhood_indices
+        strtree["value"].geometries[index] for index in neighborhood_indices
     ]
     # Create the list of neighborhoods associated with the point by indexing "geoms" with neighborhood geoms
-    neighborhoods = [neighborhood_strtree["geoms"][g] for g in neighborhood_geometries]
+    neighborhoods = [strtree["geoms"][g] for g in neighborhood_geometries]
     # Return result
     return neighborhoods
 
 
+# Number of candidate parcels tested against a region at a time, so results stream while the query runs
+REGION_CHUNK_SIZE = 1_000
+
+# (layer, value, predicate): {"source": layer data, "strtree": parcel index, "value": array of parcel indices}
+region_cache = {}
+
+
+# Description
+# - Returns the data a layer's regions come from, and the union of its shapes that have the given value
+# Accepts
+# - layer (str): "neighborhoods" or one of the keys in geojson_layers
+# - value: the zip code, municipality name, district number, or neighborhood association name
+def _get_region_(layer, value):
+    if layer == "neighborhoods":
+        source = _load_neighborhood_strtree_()
+        shapes = source["geoms"].items()
+    elif layer in geojson_layers:
+        variable, filename, get_value = geojson_layers[layer]
+        source = shapes = globals()[variable]
+    else:
+        raise ValueError(
+            f"unknown layer {layer!r}, must be one of {['neighborhoods'] + list(geojson_layers)}"
+        )
+    return source, shapely.union_all([geom for geom, v in shapes if v == value])
+
+
+# Description
+# - Yields arrays of the positions in the parcel STRtree of the parcels in a region
+def _iter_parcel_indices_in_(strtree, layer, value, predicate, cache):
+    if predicate not in ("intersects", "contains"):
+        raise ValueError('predicate must be "intersects" or "contains"')
+    source, region = _get_region_(layer, value)
+
+    key = (layer, value, predicate)
+    cached = region_cache.get(key)
+    if (
+        cached is not None
+        and cached["source"] is source
+        and cached["strtree"] is strtree
+    ):
+        yield cached["value"]
+        return
+
+    shapely.prepare(region)
+    test = getattr(shapely, predicate)
+    # Find the parcels whose bounding boxes overlap the region, then test the parcels themselves a chunk at a time
+    candidates = np.sort(strtree["value"].query(region))
+    matches = []
+    for start in range(0, len(candidates), REGION_CHUNK_SIZE):
+        chunk = candidates[start : start + REGION_CHUNK_SIZE]
+        chunk = chunk[test(region, _parcel_geometries_(strtree, chunk))]
+        matches.append(chunk)
+        yield chunk
+
+    # only cache once every parcel has been tested
+    if cache:
+        region_cache[key] = {
+            "source": source,
+            "strtree": strtree,
+            "value": np.concatenate(matches) if matches else candidates,
+        }
+
+
+# Description
+# - Yields the addresses of the parcels in a zip code, municipality, council district, or neighborhood association
+# Accepts
+# - layer (str): "zipcodes", "municipalities", "city_council_districts", "old_city_council_districts", or "neighborhoods"
+# - value: the zip code (int), municipality name, district number (int), or neighborhood association name
+# - predicate (str): "intersects" includes parcels that cross the boundary, "contains" only parcels entirely inside
+# - cache (bool): remember the result, so the next query for the same region is a lookup
+# Returns
+# - addresses (generator of str): in the order of the parcel index - an address appears once per parcel
+# Note
+# - an unknown value is an empty region, so nothing is yielded
+def iter_addresses_in(layer, value, predicate="intersects", cache=False):
+    strtree = _load_parcel_strtree_()
+    for indices in _iter_parcel_indices_in_(strtree, layer, value, predicate, cache):
+        for index in indices:
+            yield strtree["addresses"][index]
+
+
+# Description
+# - Like iter_addresses_in, but yields (address, parcel) tuples where parcel is a shapely geometry
+def iter_parcels_in(layer, value, predicate="intersects", cache=False):
+    strtree = _load_parcel_strtree_()
+    for indices in _iter_parcel_indices_in_(strtree, layer, value, predicate, cache):
+        geometries = _parcel_geometries_(strtree, indices)
+        for index, geometry in zip(indices, geometries):
+            yield strtree["addresses"][index], geometry
+
+
 # Open the intersections.csv.gz file and grab the first (and only) row containing the intersection data
-with gzip.open(
-    os.path.join(directory, "intersections.csv.gz"), "rt", newline="", encoding="utf-8"
-) as f:
-    r = csv.DictReader(f)
-    intersections = next(r)
+def _read_intersections_(path):
+    with gzip.open(path, "rt", newline="", encoding="utf-8") as f:
+        r = csv.DictReader(f)
+        return next(r)
+
+
+intersections = _read_intersections_(os.path.join(directory, "intersections.csv.gz"))
+
+# Directions are left out when matching street names, so "E 11th St" and "11th St" are the same street
+street_directions = {
+    "N",
+    "NE",
+    "E",
+    "SE",
+    "S",
+    "SW",
+    "W",
+    "NW",
+    "NORTH",
+    "NORTHEAST",
+    "EAST",
+    "SOUTHEAST",
+    "SOUTH",
+    "SOUTHWEST",
+    "WEST",
+    "NORTHWEST",
+}
+
+# USPS suffixes that are not abbreviated (so they aren't in street_suffixes) and are used in the street data
+unabbreviated_suffixes = {"LOOP", "PASS", "PATH", "PIKE", "RAMP", "ROW", "RUN", "WAY"}
+
+
+# Description
+# - Returns the key used to match a street name: uppercase, without directions, with a spelled-out suffix
+#   abbreviated (Ex: "E 11th Street" -> "11TH ST")
+def _normalize_street_(street):
+    words = street.upper().replace(".", "").split()
+    without_directions = [word for word in words if word not in street_directions]
+    # keep the directions if the street is named only with them
+    if without_directions:
+        words = without_directions
+    if words:
+        words[-1] = street_suffixes.get(words[-1], words[-1])
+    return " ".join(words)
+
+
+# Description
+# - Returns the variations of a normalized street name that are one character deletion away
+def _street_deletions_(street):
+    return {street[:i] + street[i + 1 :] for i in range(len(street))}
+
+
+# Description
+# - Builds the street name index used by get_intersection_coordinates from the intersection data.
+#   The street names in the data (like "Market" and "Market St") are the street IDs.
+# Returns
+# - index (dict): "intersections" is the data it was built from, "names" maps a normalized name to street IDs,
+#   "bases" maps a normalized name without its suffix to street IDs without a suffix, "suffixes" is every
+#   suffix that may be left off, and "deletions" maps a name with one character deleted to normalized names
+def _build_street_index_(intersections):
+    names = {}
+    bases = {}
+    # only known suffixes - other last words in the data ("Hixson", "White", "On") are part of the name
+    suffixes = (
+        set(street_suffixes) | set(street_suffixes.values()) | unabbreviated_suffixes
+    )
+    for key in intersections:
+        streets = key.split(" & ")
+        if len(streets) != 2:
+            continue
+        for street, other in (streets, streets[::-1]):
+            names.setdefault(_normalize_street_(street), {})[street] = None
+            # "Market St & 11th" is a suffixed version of "Market & 11th", if that is in the data too
+            base, _, suffix = street.rpartition(" ")
+            if (
+                base
+                and suffix.upper() in suffixes
+                and f"{base} & {other}" in intersections
+            ):
+                bases.setdefault(_normalize_street_(base), {})[base] = None
+
+    deletions = {}
+    for name in names:
+        for deletion in _street_deletions_(name) | {name}:
+            deletions.setdefault(deletion, []).append(name)
+
+    return {
+        "intersections": intersections,
+        "names": {name: list(streets) for name, streets in names.items()},
+        "bases": {name: list(streets) for name, streets in bases.items()},
+        "suffixes": suffixes,
+        "deletions": deletions,
+    }
+
+
+# built the first time an intersection name isn't an exact match
+street_index = {"intersections": None}
+
+
+def _load_street_index_():
+    global street_index
+    current = intersections
+    if street_index["intersections"] is not current:
+        street_index = _build_street_index_(current)
+    return street_index
+
+
+# Description
+# - Returns the street IDs (street names as written in the intersection data) that a street name may refer to,
+#   best match first
+def _resolve_street_(index, street):
+    name = _normalize_street_(street)
+    streets = list(index["names"].get(name, []))
+
+    # a suffix that isn't in the data (or is wrong) still matches the street without a suffix
+    base, _, suffix = name.rpartition(" ")
+    if base and suffix in index["suffixes"]:
+        streets += index["bases"].get(base, [])
+
+    # small misspellings: names within one insertion, deletion, or substitution - short names are left
+    # out, as too many other names are within one character of them
+    if not streets and len(base if suffix in index["suffixes"] else name) >= 5:
+        digits = [c for c in name if c.isdigit()]
+        for deletion in _street_deletions_(name) | {name}:
+            for candidate in index["deletions"].get(deletion, []):
+                # never change a number - "12th" is not a misspelling of "11th"
+                if [c for c in candidate if c.isdigit()] == digits:
+                    streets += index["names"][candidate]
+
+    return list(dict.fromkeys(streets))
 
 
 # Description
@@ -476,23 +1972,6 @@ def get_intersection_coordinates(name):
         if bool(re.search(contains_direction, street)):
             street = re.sub(contains_direction, "", street)
 
-        # # If there is no suffix at the end of the street name, the correct one needs to be found and added
-        # last_word = street.split(" ")[-1].upper()
-        # if last_word not in street_suffixes and last_word not in street_suffixes.values():
-        #     match_found = False
-        #     for intersection in intersections:
-        #         i_streets = intersection.split(" & ")
-        #         for i_street in i_streets:
-        #             i_street_split = i_street.split(" ")
-        #             suffix = i_street_split.pop()
-        #             i_street = " ".join(i_street_split)
-        #             if i_street == street:
-        #                 street += f" {suffix}"
-        #                 match_found = True
-        #                 break
-        #         if match_found is True:
-        #             break
-
         fixed.append(street)
 
     # Make sure the streets are in alphabetical order
@@ -501,16 +1980,424 @@ def get_intersection_coordinates(name):
     # Put the street names back together
     name = " & ".join(fixed)
 
-    coordinates = []
     # Access intersection coords using name as key into intersections dictionary
-    if name in intersections:
-        intersection = from_wkt(intersections[name])
+    current = intersections
+    intersection = current.get(name)
+
+    # If that isn't an exact match, resolve each street with the street index and look up the pair
+    if intersection is None and len(streets) == 2:
+        index = _load_street_index_()
+        current = index["intersections"]
+        first = _resolve_street_(index, streets[0])
+        second = _resolve_street_(index, streets[1])
+        for key in (f"{a} & {b}" for a in first for b in second):
+            if key in current:
+                intersection = current[key]
+                break
+
+    coordinates = []
+    if intersection is not None:
+        intersection = from_wkt(intersection)
         coordinates.append(intersection.x)
         coordinates.append(intersection.y)
         # Return list with coordinates
         return coordinates
 
 
+# Description
+# - Batch version of get_intersection_coordinates
+# Accepts
+# - names (list of str): intersection names like "Market St & 11th St"
+# Returns
+# - coordinates (list): [longitude, latitude] for each name, None if it can not be found
+def get_intersections_coordinates(names):
+    # repeated names are only looked up once
+    found = {}
+    results = []
+    for name in names:
+        if name not in found:
+            found[name] = get_intersection_coordinates(name)
+        results.append(found[name])
+    return results
+
+
+# Latitude near the middle of Hamilton County, where the street layer's local projection in meters is centered
+PROJECTION_LATITUDE = 35.2
+
+# "value" is reference to STRTree over the road segments projected to meters (see _project_),
+# "streets" lists the (name, suffix) of each segment in the same order as the geometries in the tree,
+# "extent" and "hull": see _get_extent_ (in meters)
+street_strtree = {"value": None, "streets": []}
+
+
+# Description
+# - Projects longitudes and latitudes to x and y in meters, using the equirectangular approximation at
+#   PROJECTION_LATITUDE - distances are within about half a percent anywhere in Hamilton County
+def _project_(longitudes, latitudes):
+    x_scale, y_scale = _meters_per_degree_(PROJECTION_LATITUDE)
+    return (
+        np.asarray(longitudes, dtype=float) * x_scale,
+        np.asarray(latitudes, dtype=float) * y_scale,
+    )
+
+
+# Description
+# - Reads a streets file (written by prepare_intersections.py) into a new index like street_strtree
+# Accepts
+# - path (str): the csv.gz file with name, suffix, and geometry columns
+def _read_streets_(path):
+    wkts = []
+    streets = []
+    with gzip.open(path, "rt", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            wkts.append(row["geometry"])
+            streets.append((row["name"], row["suffix"] or None))
+    scale = _meters_per_degree_(PROJECTION_LATITUDE)
+    geoms = shapely.transform(from_wkt(wkts), lambda coords: coords * scale)
+    extent, hull = _get_extent_(shapely.bounds(geoms))
+    return {
+        "value": STRtree(geoms),
+        "streets": streets,
+        "extent": extent,
+        "hull": hull,
+    }
+
+
+def _load_street_strtree_():
+    global street_strtree
+    if street_strtree["value"] is None:
+        street_strtree = _read_streets_(os.path.join(directory, "streets.csv.gz"))
+    return street_strtree
+
+
+# Description
+# - Batch version of get_nearest_street
+# Accepts
+# - longitudes, latitudes: sequences or arrays of coordinates (can be raw numbers or strings)
+# - max_distance: only return streets within this many meters (optional)
+# Returns
+# - streets (list): a dict like get_nearest_street returns for each point, None if no street is within max_distance
+#   or the point is outside Hamilton County
+def get_nearest_streets(longitudes, latitudes, max_distance=None):
+    strtree = _load_street_strtree_()
+    x, y = _project_(longitudes, latitudes)
+    # without max_distance, points outside the area the streets cover (like (0, 0)) are still rejected
+    rows = np.flatnonzero(_inside_("streets", strtree, x, y, max_distance or 0.0))
+    (point_indices, street_indices), distances = strtree["value"].query_nearest(
+        shapely.points(x[rows], y[rows]),
+        max_distance=max_distance,
+        return_distance=True,
+    )
+    # a point equally close to several segments gets the first one
+    point_indices, first = np.unique(point_indices, return_index=True)
+    point_indices = rows[point_indices]
+    results = [None] * len(x)
+    for point_index, street_index, distance in zip(
+        point_indices.tolist(),
+        street_indices[first].tolist(),
+        distances[first].tolist(),
+    ):
+        name, suffix = strtree["streets"][street_index]
+        results[point_index] = {"name": name, "suffix": suffix, "distance": distance}
+    return results
+
+
+# Description
+# - Returns the street nearest to a point, from the Hamilton County road centerlines.  Useful for points in
+#   rights-of-way, parks, or parking lots, where get_address finds no parcel.
+# Accepts
+# - longitude: the longitude (x-) coordinate of the input point (can be raw number or string)
+# - latitude: the latitude (y-) coordinate of the input point (can be raw number or string)
+# - max_distance: only return a street within this many meters (optional)
+# Returns
+# - street (dict): "name" (str), "suffix" (str or None), and "distance" (meters) of the nearest road segment,
+#   or None if the point is outside Hamilton County
+def get_nearest_street(longitude, latitude, max_distance=None):
+    return get_nearest_streets([longitude], [latitude], max_distance=max_distance)[0]
+
+
+# Reloads run one at a time, in the order they were requested, on this background thread
+_reload_executor_ = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="geochatt-reload"
+)
+
+
+# Description
+# - Applies a parcel diff to the current parcels without re-reading the whole parcels file
+# Accepts
+# - diff (dict): {"added": {address: wkt}, "changed": {address: wkt}, "removed": [address]} - every key is optional
+# Returns
+# - parcels (dict): address -> WKT geometry
+# - geoms (dict): shapely geometry -> address, reusing the parsed geometries of untouched parcels
+def _apply_parcel_diff_(diff):
+    removed = set(diff.get("removed", ()))
+    updated = {**diff.get("added", {}), **diff.get("changed", {})}
+    touched = removed | updated.keys()
+
+    new_parcels = dict(parcels)
+    for address in removed:
+        new_parcels.pop(address, None)
+    new_parcels.update(updated)
+
+    geoms = {
+        geom: address
+        for geom, address in parcel_strtree["geoms"].items()
+        if address not in touched
+    }
+    for address, wkt in updated.items():
+        geoms[from_wkt(wkt)] = address
+    return new_parcels, geoms
+
+
+def _reload_(layer, path, diff):
+    global parcels, parcel_strtree, address_index, neighborhood_strtree
+    global intersections, street_index, street_strtree
+    # Everything is built on the side, then swapped in with a single assignment per variable
+    if layer == "parcels":
+        if diff is not None:
+            # the diff is applied to the parsed geometries, so make sure they are loaded
+            _load_parcel_strtree_()
+        if diff is None and parcel_strtree["quantized"] is not None:
+            use_quantized_storage(path)
+            return
+        if diff is None and parcel_strtree["shared"] is not None:
+            # rebuild the shared file in place (other processes keep their mapping of the old file until they
+            # call use_shared_index), instead of falling back to a per-process copy of the parcels
+            shared_path = parcel_strtree["shared"].path
+            build_shared_index(shared_path, path)
+            use_shared_index(shared_path)
+            return
+        with _parcel_lock_:
+            if diff is None:
+                new_parcels, geoms = _read_parcels_(
+                    path or os.path.join(directory, "live_parcels.csv.gz"),
+                    with_geoms=True,
+                )
+            else:
+                new_parcels, geoms = _apply_parcel_diff_(diff)
+            new_strtree = _build_parcel_strtree_(geoms)
+            new_address_index = _build_address_index_(new_parcels)
+            parcel_strtree = new_strtree
+            parcels = new_parcels
+            address_index = new_address_index
+    elif layer == "neighborhoods":
+        neighborhood_strtree = _read_neighborhoods_(
+            path or os.path.join(directory, "neighborhoods.csv.gz")
+        )
+    elif layer == "streets":
+        street_strtree = _read_streets_(
+            path or os.path.join(directory, "streets.csv.gz")
+        )
+    elif layer == "intersections":
+        new_intersections = _read_intersections_(
+            path or os.path.join(directory, "intersections.csv.gz")
+        )
+        new_street_index = _build_street_index_(new_intersections)
+        intersections = new_intersections
+        street_index = new_street_index
+    else:
+        variable, filename, get_value = geojson_layers[layer]
+        shapes = _read_geojson_layer_(layer, path)
+        new_shape_strtree = _build_shape_strtree_(shapes)
+        with _shape_lock_:
+            shape_strtrees[layer] = new_shape_strtree
+            globals()[variable] = shapes
+
+
+# Description
+# - Reloads a layer from refreshed data in the background and swaps it in once it is fully built,
+#   so lookups keep using the old data until then and never see a half-built index
+# Accepts
+# - layer (str): "parcels", "neighborhoods", "intersections", "streets", "zipcodes", "municipalities",
+#   "city_council_districts", or "old_city_council_districts"
+# - path (str): the refreshed data file, in the same format as the packaged one (optional - defaults to the packaged file)
+# - diff (dict): for "parcels" only - {"added": {address: wkt}, "changed": {address: wkt}, "removed": [address]},
+#   applied to the current parcels instead of reading a whole file
+#   Parcels stay in the storage in use: a shared index file is rebuilt and remapped, and quantized storage is rebuilt
+# - wait (bool): whether to block until the new data is in use
+# Returns
+# - future (concurrent.futures.Future): done once the new data is in use - result() raises if the reload failed
+def reload(layer, path=None, diff=None, wait=False):
+    layers = ["parcels", "neighborhoods", "intersections", "streets"] + list(
+        geojson_layers
+    )
+    if layer not in layers:
+        raise ValueError(f"unknown layer {layer!r}, must be one of {layers}")
+    if diff is not None and layer != "parcels":
+        raise ValueError("diff is only supported for the parcels layer")
+    if diff is not None and path is not None:
+        raise ValueError("reload accepts a path or a diff, not both")
+    if diff is not None and parcel_strtree["shared"] is not None:
+        raise ValueError(
+            "diffs can't be applied to a shared index, build a new one and call use_shared_index"
+        )
+    if diff is not None and parcel_strtree["quantized"] is not None:
+        raise ValueError(
+            "diffs can't be applied to quantized storage, reload the whole parcels file"
+        )
+
+    future = _reload_executor_.submit(_reload_, layer, path, diff)
+    if wait:
+        future.result()
+    return future
+
+
+# "method name": (function, batch version of the function or None, names of its arguments in tab-separated requests)
+stdin_methods = {
+    "get-address": (get_address, get_addresses, ["longitude", "latitude"]),
+    "get-city-council-district": (
+        get_city_council_district,
+        get_city_council_districts,
+        ["longitude", "latitude", "date"],
+    ),
+    "get-municipality": (
+        get_municipality,
+        get_municipalities,
+        ["longitude", "latitude"],
+    ),
+    "get-zipcode": (get_zipcode, get_zipcodes, ["longitude", "latitude"]),
+    "get-parcel": (get_parcel, None, ["address"]),
+    "get-parcel-centroid": (get_parcel_centroid, None, ["address"]),
+    "get-intersection-coordinates": (get_intersection_coordinates, None, ["name"]),
+}
+
+
+# Description
+# - Yields lists of the lines that arrive together on a stream, so they can be answered as one batch
+def _read_batches_(stream):
+    try:
+        fd = stream.fileno()
+    except (AttributeError, OSError):
+        # not backed by a file descriptor (like io.StringIO), so answer one line at a time
+        for line in stream:
+            yield [line]
+        return
+
+    pending = b""
+    while True:
+        # os.read returns whatever has arrived so far instead of waiting to fill the buffer
+        chunk = os.read(fd, 1 << 16)
+        if not chunk:
+            break
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        if lines:
+            # invalid bytes become U+FFFD, so a garbled line gets an error instead of ending the process
+            yield [line.decode("utf-8", errors="replace") for line in lines]
+    if pending:
+        yield [pending.decode("utf-8", errors="replace")]
+
+
+# Description
+# - Parses a request line, either JSON ({"method": "get-zipcode", "longitude": ..., "latitude": ...})
+#   or tab-separated values (the method, then its arguments in the order listed in stdin_methods)
+# Returns
+# - (format, id, method, arguments): format is "json" or "tsv", id is the JSON request's "id" (if any),
+#   and arguments is a dict of keyword arguments for the method
+def _parse_request_(line):
+    if line.lstrip().startswith("{"):
+        arguments = json.loads(line)
+        format = "json"
+        request_id = arguments.pop("id", None)
+        method = str(arguments.pop("method", "")).replace("_", "-")
+    else:
+        values = line.rstrip("\r").split("\t")
+        format = "tsv"
+        request_id = None
+        method = values[0].replace("_", "-")
+    if method not in stdin_methods:
+        raise ValueError(f"unknown method {method!r}")
+    if format == "tsv":
+        arguments = dict(zip(stdin_methods[method][2], values[1:]))
+    return format, request_id, method, arguments
+
+
+# Description
+# - Answers a batch of request lines, in order.  Point lookups that use the same method are answered with one
+#   call to the batch version of the method.
+# Returns
+# - responses (list of str): one line for each request line that isn't blank
+def _answer_lines_(lines):
+    # (format, id, method, arguments) for each request, and the result for each request that has been answered
+    requests = []
+    results = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            requests.append(_parse_request_(line))
+        except Exception as error:
+            results[len(requests)] = error
+            format = "json" if line.lstrip().startswith("{") else "tsv"
+            request_id = None
+            if format == "json":
+                # echo the id of a request that is valid JSON, but not a valid request
+                try:
+                    request_id = json.loads(line).get("id")
+                except Exception:
+                    pass
+            requests.append((format, request_id, None, None))
+
+    # group the point lookups by method (and date, for council districts) - requests with other arguments
+    # (like max_distance) are answered one at a time below, so they reach the method exactly as given
+    groups = {}
+    for i, (format, request_id, method, arguments) in enumerate(requests):
+        if (
+            i not in results
+            and stdin_methods[method][1] is not None
+            and set(arguments) <= set(stdin_methods[method][2])
+        ):
+            groups.setdefault((method, arguments.get("date")), []).append(i)
+    for (method, date), indices in groups.items():
+        try:
+            values = stdin_methods[method][1](
+                [requests[i][3]["longitude"] for i in indices],
+                [requests[i][3]["latitude"] for i in indices],
+                **({"date": date} if date else {}),
+            )
+        except Exception:
+            # a bad request spoils its whole group, so those requests are answered one at a time below
+            continue
+        results.update(zip(indices, values))
+
+    responses = []
+    for i, (format, request_id, method, arguments) in enumerate(requests):
+        if i not in results:
+            try:
+                results[i] = stdin_methods[method][0](**arguments)
+            except Exception as error:
+                results[i] = error
+        result = results[i]
+        if format == "json":
+            response = {} if request_id is None else {"id": request_id}
+            if isinstance(result, Exception):
+                response["error"] = str(result)
+            else:
+                response["result"] = result
+            responses.append(json.dumps(response, default=str))
+        elif isinstance(result, Exception):
+            responses.append(f"ERROR: {result}")
+        else:
+            responses.append(str(result))
+    return responses
+
+
+# Description
+# - Reads requests from input, one per line, and writes the answer to each on output in the same order.
+#   This keeps one warm process (with its data loaded) for a whole pipeline, instead of one process per value.
+# Accepts
+# - input: a text stream of JSON or tab-separated request lines (see _parse_request_)
+# - output: a text stream for the responses - JSON requests get {"result": ...} or {"error": ...}
+#   (plus "id" if the request had one), and tab-separated requests get the result as the CLI prints it
+def serve(input, output):
+    for lines in _read_batches_(input):
+        responses = _answer_lines_(lines)
+        if responses:
+            output.write("\n".join(responses) + "\n")
+            output.flush()
+
+
 def main():
     parser = argparse.ArgumentParser(
         prog="geochatt",
@@ -518,14 +2405,26 @@ def main():
     )
     parser.add_argument(
         "method",
+        nargs="?",
         help='method to run, can be "get-address", "get-city-council-district", "get-parcel", "get-parcel-centroid", "get-zipcode"',
     )
     parser.add_argument("--address", type=str, help="address")
     parser.add_argument("--latitude", type=float, help="latitude")
     parser.add_argument("--longitude", type=float, help="latitude")
+    parser.add_argument(
+        "--stdin",
+        action="store_true",
+        help='answer requests read from stdin, one per line, as JSON like {"method": "get-zipcode", "longitude": -85.3, "latitude": 35.0} or tab-separated values like "get-zipcode<TAB>-85.3<TAB>35.0"',
+    )
     args = parser.parse_args()
     # print("args:", args)
 
+    if args.stdin:
+        serve(sys.stdin, sys.stdout)
+        return
+    if args.method is None:
+        parser.error("method is required unless --stdin is used")
+
     if args.method in ["get-address", "get_address"]:
         print(get_address(latitude=args.latitude, longitude=args.longitude))
     elif args.method in ["get-city-council-district", "get_city_council_district"]:
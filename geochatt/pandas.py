@@ -0,0 +1,136 @@
+# Adds the geochatt accessor to pandas DataFrames (see DataFrame.geochatt.enrich below).
+# It is registered when this module is imported, so "import geochatt" doesn't have to load pandas:
+#   import geochatt.pandas
+import numpy as np
+import pandas
+import shapely
+from shapely import from_wkt
+
+import geochatt
+
+# "field name": batch lookup used to fill the column of that name in DataFrame.geochatt.enrich
+enrich_fields = {
+    "address": geochatt.get_addresses,
+    "city_council_district": geochatt.get_city_council_districts,
+    "municipality": geochatt.get_municipalities,
+    "zipcode": geochatt.get_zipcodes,
+}
+
+
+# Description
+# - Maps the category codes of one batch call to codes into values, adding the categories that are used
+# Accepts
+# - codes, categories: as returned by a batch function with codes=True
+# - values (dict): maps each value to its code, shared by every chunk of a column
+def _merge_codes_(codes, categories, values):
+    used, inverse = np.unique(codes, return_inverse=True)
+    # parcels can share an address, so repeated values are merged into one category
+    used_codes = np.array(
+        [
+            values.setdefault(categories[code], len(values)) if code >= 0 else -1
+            for code in used.tolist()
+        ],
+        dtype=np.int32,
+    )
+    return used_codes[inverse.reshape(-1)]
+
+
+# Adds df.geochatt to pandas DataFrames
+@pandas.api.extensions.register_dataframe_accessor("geochatt")
+class GeoChattAccessor:
+    def __init__(self, df):
+        self._df = df
+
+    # Description
+    # - Returns a copy of the DataFrame with geochatt columns added, looked up a chunk of rows at a time
+    #   with the batch functions
+    # Accepts
+    # - lon, lat (str): the names of the longitude and latitude columns
+    # - address (str): the name of an address column, used instead of lon and lat.  The "parcel" (WKT),
+    #   "longitude" and "latitude" (of the parcel centroid) fields are available, and the other fields
+    #   are looked up at the parcel centroid.
+    # - fields (list of str): the columns to add, from "address", "city_council_district", "municipality",
+    #   "zipcode" (the default), plus "parcel", "longitude", "latitude" with address (default for address)
+    # - categorical (bool): whether to add categorical columns - otherwise nullable typed columns are added
+    # - chunksize (int): the number of rows looked up per batch call
+    # - date (str): the date passed to get_city_council_districts (MM-DD-YYYY)
+    def enrich(
+        self,
+        lon=None,
+        lat=None,
+        fields=None,
+        address=None,
+        categorical=True,
+        chunksize=100_000,
+        date=None,
+    ):
+        df = self._df.copy()
+
+        if address is not None:
+            if fields is None:
+                fields = ["parcel", "longitude", "latitude"]
+            # check before fields is narrowed to the lookups below, so typos aren't dropped
+            unknown = [
+                field
+                for field in fields
+                if field not in enrich_fields
+                and field not in ("parcel", "longitude", "latitude")
+            ]
+            if unknown:
+                raise ValueError(f"unknown fields {unknown}")
+            # each distinct address only goes through get_parcel once
+            codes, addresses = pandas.factorize(df[address])
+            wkts = [geochatt.get_parcel(str(a)) for a in addresses]
+            found = [wkt is not None for wkt in wkts]
+            centroids = shapely.centroid(
+                from_wkt([wkt for wkt in wkts if wkt is not None])
+            )
+            # one extra NaN at the end for the code -1 of missing addresses, like the None after wkts below
+            x = np.full(len(wkts) + 1, np.nan)
+            y = np.full(len(wkts) + 1, np.nan)
+            x[:-1][found] = shapely.get_x(centroids)
+            y[:-1][found] = shapely.get_y(centroids)
+            longitudes = x[codes]
+            latitudes = y[codes]
+            if "parcel" in fields:
+                values = np.array(wkts + [None], dtype=object)[codes]
+                df["parcel"] = pandas.array(values, dtype="string")
+            if "longitude" in fields:
+                df["longitude"] = longitudes
+            if "latitude" in fields:
+                df["latitude"] = latitudes
+            fields = [field for field in fields if field in enrich_fields]
+        else:
+            if lon is None or lat is None:
+                raise ValueError("enrich requires lon and lat, or address")
+            if fields is None:
+                fields = list(enrich_fields)
+            longitudes = df[lon].to_numpy(dtype=float)
+            latitudes = df[lat].to_numpy(dtype=float)
+
+        unknown = [field for field in fields if field not in enrich_fields]
+        if unknown:
+            raise ValueError(f"unknown fields {unknown}")
+
+        valid = ~(np.isnan(longitudes) | np.isnan(latitudes))
+        for field in fields:
+            codes = np.full(len(df), -1, dtype=np.int32)
+            # each chunk is decoded with its own categories, as a reload between chunks can change them
+            values = {}
+            for start in range(0, len(df), chunksize):
+                chunk = slice(start, start + chunksize)
+                rows = np.flatnonzero(valid[chunk]) + start
+                if len(rows) == 0:
+                    continue
+                arguments = {"date": date} if field == "city_council_district" else {}
+                chunk_codes, categories = enrich_fields[field](
+                    longitudes[rows], latitudes[rows], codes=True, **arguments
+                )
+                codes[rows] = _merge_codes_(chunk_codes, categories, values)
+            if categorical:
+                df[field] = pandas.Categorical.from_codes(
+                    codes, categories=list(values)
+                )
+            else:
+                df[field] = pandas.array(geochatt._decode_(codes, list(values)))
+        return df
@@ -22,6 +22,9 @@ result_offset = 0
 # Create dictionary with geometries as keys and their names as values
 line_strings = {}
 
+# List of dictionaries, with each dictionary being a road segment to write to streets.csv.gz
+streets = []
+
 for i in range(1_000_000_000_000):
     # Construct the URL to query the data
     url = "https://pwgis.chattanooga.gov/server/rest/services/HC_Base/Block_lc/MapServer/0/query?where=1%3D1&outFields=*"
@@ -44,7 +47,7 @@ for i in range(1_000_000_000_000):
     for feature in response_data["features"]:
         name = feature["properties"]["Name"]
         if feature["properties"]["TypeSuffix"] is not None:
-            name += f"/{feature["properties"]["TypeSuffix"]}"
+            name += f"/{feature['properties']['TypeSuffix']}"
         # Some features are LineStrings while others are MultiLineString - make the appropriate Shapely object
         if feature["geometry"]["type"] == "LineString":
             geometry = shapely.LineString(feature["geometry"]["coordinates"])
@@ -52,6 +55,14 @@ for i in range(1_000_000_000_000):
             geometry = shapely.MultiLineString(feature["geometry"]["coordinates"])
         # Add to dictionary
         line_strings[geometry] = name
+        # Keep the road segment itself for nearest-street lookups
+        streets.append(
+            {
+                "name": feature["properties"]["Name"],
+                "suffix": feature["properties"]["TypeSuffix"] or "",
+                "geometry": geometry.wkt,
+            }
+        )
         # Increment count_features
         count_features += 1
 
@@ -174,3 +185,15 @@ with gzip.open(
     writer = csv.DictWriter(csvfile, fieldnames=intersection_data[0].keys())
     writer.writeheader()
     writer.writerows(intersection_data)
+
+"""
+The road segments are also written to their own csv.gz file, with one row per segment, so geochatt can find
+the street nearest to a point.
+"""
+
+with gzip.open(
+    "./geochatt/streets.csv.gz", "wt", newline="", encoding="utf-8"
+) as csvfile:
+    writer = csv.DictWriter(csvfile, fieldnames=["name", "suffix", "geometry"])
+    writer.writeheader()
+    writer.writerows(streets)
@@ -19,11 +19,13 @@ setup(
             "live_parcels.csv.gz",
             "municipalities.geojson",
             "neighborhoods.csv.gz",
+            "pandas.py",
+            "streets.csv.gz",
             "zipcodes.geojson",
         ]
     },
     entry_points={
-        "console_scripts": ["geochatt=geochatt.__init__:main"],
+        "console_scripts": ["geochatt=geochatt:main"],
     },
     version="0.3.1",
     description="Utility Functions for Working with Open GeoSpatial Data about Chattanooga",
@@ -40,5 +42,6 @@ setup(
         "License :: CC0 1.0 Universal (CC0 1.0) Public Domain Dedication",
         "Operating System :: OS Independent",
     ],
-    install_requires=["shapely"],
+    install_requires=["numpy", "shapely"],
+    extras_require={"pandas": ["pandas"]},
 )
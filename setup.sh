@@ -15,5 +15,5 @@ python prepare_parcels.py
 # download neighborhoods
 python prepare_neighborhoods.py
 
-# download intersections
+# download intersections and streets
 python prepare_intersections.py
\ No newline at end of file
@@ -1,8 +1,19 @@
+import io
+import json
+import os
 import random
+import tempfile
 import unittest
 
 import geochatt
 
+# pandas is optional, and the DataFrame accessor is only registered by importing geochatt.pandas
+try:
+    import pandas
+    import geochatt.pandas
+except ImportError:
+    pandas = None
+
 
 class TestCityHall(unittest.TestCase):
     def test_get_intersection_coordinates(self):
@@ -20,6 +31,29 @@ class TestCityHall(unittest.TestCase):
         result = geochatt.get_intersection_coordinates(name="Market and 11th")
         self.assertEqual(result, [-85.30934947677113, 35.04392856867984])
 
+    def test_get_intersection_coordinates_suffix_and_direction(self):
+        result = geochatt.get_intersection_coordinates(
+            name="Market Street & E 11th Street"
+        )
+        self.assertEqual(result, [-85.30934947677113, 35.04392856867984])
+
+    def test_get_intersection_coordinates_misspelled(self):
+        result = geochatt.get_intersection_coordinates(name="Markt St & 11th St")
+        self.assertEqual(result, [-85.30934947677113, 35.04392856867984])
+        # numbers are never corrected - there is no 91st St, and it isn't taken as 21st St
+        self.assertNotEqual(
+            geochatt.get_intersection_coordinates(name="Market St & 21st St"), None
+        )
+        self.assertEqual(
+            geochatt.get_intersection_coordinates(name="Market St & 91st St"), None
+        )
+
+    def test_get_intersections_coordinates(self):
+        result = geochatt.get_intersections_coordinates(
+            ["Market and 11th", "Exit Interstate 75 Off Ramp & Hickory Valley Rd"]
+        )
+        self.assertEqual(result, [[-85.30934947677113, 35.04392856867984], None])
+
     def test_get_intersection_coordinates_pass_over(self):
         # Test where I-75 passes over Hickory Valley Road (not an intersection, but looks like one on the map)
         result = geochatt.get_intersection_coordinates(
@@ -61,10 +95,68 @@ class TestCityHall(unittest.TestCase):
             "POLYGON ((-85.3069572 35.0438971, -85.3074818 35.0440927, -85.3075952 35.0438743, -85.3078312 35.0434434, -85.3073193 35.0432494, -85.3069718 35.0438707, -85.3069572 35.0438971))",
         )
 
+    def test_suggest_addresses(self):
+        self.assertEqual(geochatt.suggest_addresses("101 EAST 11"), ["101 E 11TH ST"])
+        self.assertEqual(
+            geochatt.suggest_addresses("101 east 11th street"), ["101 E 11TH ST"]
+        )
+        # a direction at the end of the input is abbreviated too
+        self.assertEqual(geochatt.suggest_addresses("101 EAST"), ["101 E 11TH ST"])
+        # and so is a direction or suffix that is only partly typed
+        for prefix in ["101 ea", "101 eas", "101 east 11th str", "101 east 11th stre"]:
+            self.assertIn("101 E 11TH ST", geochatt.suggest_addresses(prefix))
+        result = geochatt.suggest_addresses("10", limit=5)
+        self.assertEqual(len(result), 5)
+        self.assertEqual(result, sorted(result))
+        self.assertTrue(all(address.startswith("10") for address in result))
+
     def test_get_address(self):
         result = geochatt.get_address(latitude=35.0432979, longitude=-85.3076591)
         self.assertEqual(result, "101 E 11TH ST")
 
+    def test_get_addresses_near(self):
+        result = geochatt.get_addresses_near(
+            longitude=-85.3076591, latitude=35.0432979, radius_m=150
+        )
+        # the point is just outside the parcel boundary
+        self.assertEqual(result[0][0], "101 E 11TH ST")
+        self.assertLess(result[0][1], 10)
+        distances = [distance for address, distance in result]
+        self.assertEqual(distances, sorted(distances))
+        self.assertTrue(all(distance <= 150 for distance in distances))
+
+    def test_get_addresses_near_k(self):
+        result = geochatt.get_addresses_near(
+            longitude=-85.3076591, latitude=35.0432979, k=10
+        )
+        self.assertEqual(len(result), 10)
+        self.assertEqual(result[0][0], "101 E 11TH ST")
+        distances = [distance for address, distance in result]
+        self.assertEqual(distances, sorted(distances))
+        # the 10 nearest within a radius are the first 10 results of that radius
+        within = geochatt.get_addresses_near(
+            longitude=-85.3076591, latitude=35.0432979, radius_m=distances[-1]
+        )
+        self.assertEqual(result, within[:10])
+
+    def test_get_nearest_street(self):
+        # the corner of 11th St and Market St
+        result = geochatt.get_nearest_street(
+            longitude=-85.30934947677113, latitude=35.04392856867984
+        )
+        self.assertIn(result["name"], ["Market", "11th"])
+        self.assertEqual(result["suffix"], "St")
+        self.assertLess(result["distance"], 1)
+
+    def test_get_nearest_streets(self):
+        result = geochatt.get_nearest_streets(
+            longitudes=[-85.30934947677113, 0],
+            latitudes=[35.04392856867984, 0],
+            max_distance=100,
+        )
+        self.assertIn(result[0]["name"], ["Market", "11th"])
+        self.assertEqual(result[1], None)
+
     def test_get_city_council_district(self):
         result = geochatt.get_city_council_district(
             latitude=35.0432979, longitude=-85.3076591
@@ -79,6 +171,377 @@ class TestCityHall(unittest.TestCase):
         result = geochatt.get_zipcode(longitude=-85.3076591, latitude=35.0432979)
         self.assertEqual(result, 37402)
 
+    def test_batch_lookups(self):
+        longitudes = [-85.3076591, 0, -85.3076591]
+        latitudes = [35.0432979, 0, 35.0432979]
+        self.assertEqual(
+            geochatt.get_addresses(longitudes, latitudes),
+            ["101 E 11TH ST", None, "101 E 11TH ST"],
+        )
+        self.assertEqual(
+            geochatt.get_city_council_districts(longitudes, latitudes), [8, None, 8]
+        )
+        self.assertEqual(
+            geochatt.get_municipalities(longitudes, latitudes),
+            ["Chattanooga", None, "Chattanooga"],
+        )
+        self.assertEqual(
+            geochatt.get_zipcodes(longitudes, latitudes), [37402, None, 37402]
+        )
+
+    def test_batch_lookups_codes(self):
+        codes, categories = geochatt.get_zipcodes(
+            longitudes=[-85.3076591, 0], latitudes=[35.0432979, 0], codes=True
+        )
+        self.assertEqual(codes.dtype.name, "int32")
+        self.assertEqual(categories[codes[0]], 37402)
+        self.assertEqual(codes[1], -1)
+
+    def test_iter_addresses_in(self):
+        result = list(geochatt.iter_addresses_in("city_council_districts", 8))
+        self.assertIn("101 E 11TH ST", result)
+        contained = list(
+            geochatt.iter_addresses_in(
+                "city_council_districts", 8, predicate="contains", cache=True
+            )
+        )
+        self.assertTrue(set(contained) <= set(result))
+        # the second query comes from the cache
+        self.assertEqual(
+            list(
+                geochatt.iter_addresses_in(
+                    "city_council_districts", 8, predicate="contains", cache=True
+                )
+            ),
+            contained,
+        )
+        self.assertEqual(list(geochatt.iter_addresses_in("zipcodes", 99999)), [])
+
+    def test_iter_parcels_in(self):
+        result = dict(
+            geochatt.iter_parcels_in(
+                "neighborhoods", "Martin Luther King Neighborhood Association"
+            )
+        )
+        self.assertEqual(
+            result["101 E 11TH ST"].centroid,
+            geochatt.get_parcel_centroid("101 E 11TH ST"),
+        )
+
+    def test_rejected_points(self):
+        before = geochatt.rejected_points.get("parcels", 0)
+        self.assertEqual(geochatt.get_address(longitude=0, latitude=0), None)
+        # swapped longitude and latitude
+        self.assertEqual(
+            geochatt.get_addresses(
+                [35.0432979, -85.3076591], [-85.3076591, 35.0432979]
+            ),
+            [None, "101 E 11TH ST"],
+        )
+        self.assertEqual(geochatt.rejected_points["parcels"], before + 2)
+
+        # the street and neighborhood layers reject points too, even without max_distance
+        self.assertEqual(geochatt.get_nearest_street(longitude=0, latitude=0), None)
+        self.assertEqual(
+            geochatt.get_neighborhood_associations(longitude=0, latitude=0), []
+        )
+        self.assertGreater(geochatt.rejected_points["streets"], 0)
+        self.assertGreater(geochatt.rejected_points["neighborhoods"], 0)
+
+    def test_validate_coordinates(self):
+        result = geochatt.validate_coordinates(
+            longitudes=[-85.3076591, 0, 35.0432979, -90, float("nan")],
+            latitudes=[35.0432979, 0, -85.3076591, 35, 35],
+        )
+        self.assertEqual(result["valid"].tolist(), [True, False, False, False, False])
+        self.assertEqual(result["zero"].tolist(), [False, True, False, False, False])
+        self.assertEqual(result["swapped"].tolist(), [False, False, True, False, False])
+        self.assertEqual(result["outside"].tolist(), [False, False, False, True, True])
+
+
+@unittest.skipIf(pandas is None, "pandas is not installed")
+class TestPandas(unittest.TestCase):
+    def test_enrich(self):
+        df = pandas.DataFrame({"x": [-85.3076591, 0], "y": [35.0432979, 0]})
+        result = df.geochatt.enrich(lon="x", lat="y", fields=["address", "zipcode"])
+        self.assertEqual(result["address"].dtype.name, "category")
+        self.assertEqual(result["address"][0], "101 E 11TH ST")
+        self.assertEqual(result["zipcode"][0], 37402)
+        self.assertTrue(pandas.isna(result["zipcode"][1]))
+        self.assertNotIn("address", df.columns)
+
+    def test_enrich_typed(self):
+        df = pandas.DataFrame({"x": [-85.3076591], "y": [35.0432979]})
+        result = df.geochatt.enrich(lon="x", lat="y", categorical=False)
+        self.assertEqual(result["city_council_district"].dtype.name, "Int64")
+        self.assertEqual(result["city_council_district"][0], 8)
+        self.assertEqual(result["municipality"][0], "Chattanooga")
+
+    def test_enrich_address(self):
+        df = pandas.DataFrame({"address": ["101 east 11th street", "1 NOWHERE"]})
+        result = df.geochatt.enrich(
+            address="address", fields=["parcel", "longitude", "latitude", "zipcode"]
+        )
+        centroid = geochatt.get_parcel_centroid("101 E 11TH ST")
+        self.assertEqual(result["parcel"][0], geochatt.get_parcel("101 E 11TH ST"))
+        self.assertEqual(result["longitude"][0], centroid.x)
+        self.assertEqual(result["latitude"][0], centroid.y)
+        self.assertEqual(result["zipcode"][0], 37402)
+        self.assertTrue(pandas.isna(result["parcel"][1]))
+
+    def test_enrich_chunks_keep_their_categories(self):
+        # each call lists its categories in a different order, like a reload between chunks would
+        calls = []
+
+        def get_zipcodes(longitudes, latitudes, codes=True):
+            calls.append(None)
+            categories = [37402, 37403] if len(calls) % 2 else [37403, 37402]
+            values = geochatt.get_zipcodes(longitudes, latitudes)
+            return [categories.index(v) for v in values], categories
+
+        df = pandas.DataFrame({"x": [-85.3076591] * 3, "y": [35.0432979] * 3})
+        original = geochatt.pandas.enrich_fields["zipcode"]
+        geochatt.pandas.enrich_fields["zipcode"] = get_zipcodes
+        try:
+            for categorical in (True, False):
+                result = df.geochatt.enrich(
+                    lon="x",
+                    lat="y",
+                    fields=["zipcode"],
+                    chunksize=1,
+                    categorical=categorical,
+                )
+                self.assertEqual(list(result["zipcode"]), [37402] * 3)
+        finally:
+            geochatt.pandas.enrich_fields["zipcode"] = original
+
+    def test_enrich_no_addresses(self):
+        df = pandas.DataFrame({"address": [None, None]})
+        result = df.geochatt.enrich(
+            address="address", fields=["parcel", "longitude", "zipcode"]
+        )
+        self.assertTrue(result["parcel"].isna().all())
+        self.assertTrue(result["longitude"].isna().all())
+        self.assertTrue(result["zipcode"].isna().all())
+
+    def test_enrich_unknown_fields(self):
+        df = pandas.DataFrame({"address": ["101 east 11th street"], "x": [0], "y": [0]})
+        with self.assertRaises(ValueError):
+            df.geochatt.enrich(address="address", fields=["parcle", "zipcod"])
+        with self.assertRaises(ValueError):
+            df.geochatt.enrich(lon="x", lat="y", fields=["parcel"])
+
+
+class TestStdin(unittest.TestCase):
+    def answer(self, *lines):
+        output = io.StringIO()
+        geochatt.serve(io.StringIO("".join(line + "\n" for line in lines)), output)
+        return output.getvalue().splitlines()
+
+    def test_id_is_echoed(self):
+        response = self.answer(
+            '{"id": 7, "method": "get-zipcode", "longitude": -85.3076591, "latitude": 35.0432979}'
+        )
+        self.assertEqual(
+            [json.loads(line) for line in response], [{"id": 7, "result": 37402}]
+        )
+
+    def test_mixed_formats_keep_order(self):
+        response = self.answer(
+            "get-zipcode\t-85.3076591\t35.0432979",
+            '{"method": "get-parcel-centroid", "address": "101 east 11th street"}',
+            "",
+            '{"method": "get_address", "longitude": -85.3076591, "latitude": 35.0432979}',
+            "get-municipality\t-85.3076591\t35.0432979",
+        )
+        self.assertEqual(response[0], "37402")
+        self.assertIn("result", json.loads(response[1]))
+        self.assertEqual(json.loads(response[2]), {"result": "101 E 11TH ST"})
+        self.assertEqual(response[3], "Chattanooga")
+        self.assertEqual(len(response), 4)
+
+    def test_errors(self):
+        response = self.answer(
+            '{"id": "a", "method": "get-nothing"}',
+            "get-nothing\t1",
+            "{not json",
+            '{"method": "get-address", "longitude": -85.3076591, "latitude": 35.0432979, "typo": 1}',
+        )
+        self.assertEqual(set(json.loads(response[0])), {"id", "error"})
+        self.assertTrue(response[1].startswith("ERROR: "))
+        self.assertIn("error", json.loads(response[2]))
+        self.assertIn("error", json.loads(response[3]))
+
+    def test_invalid_utf8(self):
+        # read from a pipe, like the console script does
+        read_fd, write_fd = os.pipe()
+        os.write(
+            write_fd, b"get-zipcode\t-85.3076591\t35.0432979\n\xff\nget-zipcode\t0\t0\n"
+        )
+        os.close(write_fd)
+        output = io.StringIO()
+        with os.fdopen(read_fd, "r") as input:
+            geochatt.serve(input, output)
+        response = output.getvalue().splitlines()
+        self.assertEqual(response[0], "37402")
+        self.assertTrue(response[1].startswith("ERROR: "))
+        self.assertEqual(response[2], "None")
+
+    def test_bad_request_falls_back_to_one_at_a_time(self):
+        response = self.answer(
+            "get-zipcode\t-85.3076591\t35.0432979",
+            "get-zipcode\tnot a number\t35.0432979",
+            "get-zipcode\t-85.3076591\t35.0432979",
+        )
+        self.assertEqual(response[0], "37402")
+        self.assertTrue(response[1].startswith("ERROR: "))
+        self.assertEqual(response[2], "37402")
+
+    def test_extra_arguments_are_passed(self):
+        request = {
+            "longitude": -85.3076591,
+            "latitude": 35.0442979,
+            "max_distance": 0.01,
+        }
+        response = self.answer(json.dumps({"method": "get-address", **request}))
+        self.assertEqual(
+            json.loads(response[0]), {"result": geochatt.get_address(**request)}
+        )
+        self.assertEqual(json.loads(response[0]), {"result": "101 E 11TH ST"})
+
+
+class TestReload(unittest.TestCase):
+    def test_reload_zipcodes(self):
+        shapes = geochatt.zipcode_shapes
+        geochatt.reload("zipcodes", wait=True)
+        self.assertIsNot(geochatt.zipcode_shapes, shapes)
+        # the index is built by the reload, and a lookup still holding the old shapes uses it too
+        index = geochatt.shape_strtrees["zipcodes"]
+        self.assertIs(index["shapes"], geochatt.zipcode_shapes)
+        self.assertIs(geochatt._get_shape_strtree_("zipcodes", shapes), index)
+        self.assertEqual(
+            geochatt.get_zipcode(longitude=-85.3076591, latitude=35.0432979), 37402
+        )
+
+    def test_reload_parcels_diff(self):
+        wkt = "POLYGON ((-85.0005 35.5005, -85.0005 35.5015, -85.0015 35.5015, -85.0015 35.5005, -85.0005 35.5005))"
+        geochatt.reload("parcels", diff={"added": {"1 TEST ST": wkt}}, wait=True)
+        self.assertEqual(geochatt.get_parcel("1 TEST ST"), wkt)
+        self.assertEqual(
+            geochatt.get_address(longitude=-85.001, latitude=35.501), "1 TEST ST"
+        )
+        self.assertEqual(
+            geochatt.get_address(latitude=35.0432979, longitude=-85.3076591),
+            "101 E 11TH ST",
+        )
+
+        geochatt.reload("parcels", diff={"removed": ["1 TEST ST"]}).result()
+        self.assertEqual(geochatt.get_parcel("1 TEST ST"), None)
+        self.assertEqual(geochatt.get_address(longitude=-85.001, latitude=35.501), None)
+
+    def test_reload_unknown_layer(self):
+        with self.assertRaises(ValueError):
+            geochatt.reload("roads")
+
+
+class TestSharedIndex(unittest.TestCase):
+    def tearDown(self):
+        # go back to the in-memory parcels
+        geochatt.use_default_storage()
+
+    def test_use_shared_index(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            geochatt.use_shared_index(os.path.join(tmp, "parcels.index"))
+            self.assertEqual(
+                geochatt.get_parcel(address="101 east 11th street"),
+                "POLYGON ((-85.3069572 35.0438971, -85.3074818 35.0440927, -85.3075952 35.0438743, -85.3078312 35.0434434, -85.3073193 35.0432494, -85.3069718 35.0438707, -85.3069572 35.0438971))",
+            )
+            self.assertEqual(geochatt.get_parcel(address="1 NOWHERE ST"), None)
+            self.assertEqual(
+                geochatt.suggest_addresses("101 EAST 11"), ["101 E 11TH ST"]
+            )
+            self.assertEqual(
+                geochatt.get_address(latitude=35.0432979, longitude=-85.3076591),
+                "101 E 11TH ST",
+            )
+            self.assertEqual(
+                geochatt.get_addresses([-85.3076591, 0], [35.0432979, 0]),
+                ["101 E 11TH ST", None],
+            )
+            result = geochatt.get_addresses_near(
+                longitude=-85.3076591, latitude=35.0432979, k=3
+            )
+            self.assertEqual(result[0][0], "101 E 11TH ST")
+
+            # single lookups, inside, near, and away from parcels, agree with the batch lookups
+            longitudes = [-85.30741, -85.3076591, -85.3081, -85.2]
+            latitudes = [35.04367, 35.0432979, 35.0431, 35.2]
+            self.assertEqual(
+                [geochatt.get_address(x, y) for x, y in zip(longitudes, latitudes)],
+                geochatt.get_addresses(longitudes, latitudes),
+            )
+
+            # the grid in the file is the index, so no tree is built per process
+            self.assertIs(
+                geochatt.parcel_strtree["value"], geochatt.parcel_strtree["shared"]
+            )
+
+            # reloading rebuilds and remaps the shared file
+            geochatt.reload("parcels", wait=True)
+            self.assertIsNotNone(geochatt.parcel_strtree["shared"])
+            self.assertEqual(
+                geochatt.get_address(latitude=35.0432979, longitude=-85.3076591),
+                "101 E 11TH ST",
+            )
+
+
+class TestQuantizedStorage(unittest.TestCase):
+    def tearDown(self):
+        # go back to the in-memory parcels
+        geochatt.use_default_storage()
+
+    def test_use_quantized_storage(self):
+        random.seed(0)
+        longitudes = [-85.3076591] + [
+            random.uniform(-85.42, -85.29) for i in range(1000)
+        ]
+        latitudes = [35.0432979] + [random.uniform(34.97, 35.06) for i in range(1000)]
+        expected = geochatt.get_addresses(longitudes, latitudes)
+        wkt = geochatt.get_parcel(address="101 east 11th street")
+
+        geochatt.use_quantized_storage()
+        self.assertEqual(geochatt.get_parcel(address="101 east 11th street"), wkt)
+        self.assertEqual(geochatt.suggest_addresses("101 EAST 11"), ["101 E 11TH ST"])
+        self.assertEqual(
+            geochatt.get_address(latitude=35.0432979, longitude=-85.3076591),
+            "101 E 11TH ST",
+        )
+        self.assertEqual(geochatt.get_addresses(longitudes, latitudes), expected)
+        self.assertEqual(
+            [geochatt.get_address(x, y) for x, y in zip(longitudes, latitudes)],
+            expected,
+        )
+        # the first point is 0.0000751 degrees outside its parcel
+        self.assertIsNone(geochatt.get_address(-85.3076591, 35.0432979, 0.000075))
+        self.assertEqual(
+            geochatt.get_address(-85.3076591, 35.0432979, 0.0000752), "101 E 11TH ST"
+        )
+        result = geochatt.get_addresses_near(
+            longitude=-85.3076591, latitude=35.0432979, k=3
+        )
+        self.assertEqual(result[0][0], "101 E 11TH ST")
+        self.assertIn("101 E 11TH ST", geochatt.iter_addresses_in("zipcodes", 37402))
+
+        # reloading keeps quantized storage
+        geochatt.reload("parcels", wait=True)
+        self.assertIsNotNone(geochatt.parcel_strtree["quantized"])
+        with self.assertRaises(ValueError):
+            geochatt.reload("parcels", diff={"removed": ["101 E 11TH ST"]})
+
+        geochatt.use_default_storage()
+        self.assertIsNone(geochatt.parcel_strtree["quantized"])
+        self.assertEqual(geochatt.get_addresses(longitudes, latitudes), expected)
+
 
 class TestPerformance(unittest.TestCase):
     def test_1_million_random_points(self):
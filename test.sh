@@ -60,6 +60,15 @@ test_get_zipcode () {
     fi
 }
 
+test_stdin () {
+    result=$(printf 'get-zipcode\t-85.3076591\t35.0432979\n{"method": "get-address", "longitude": -85.3076591, "latitude": 35.0432979, "id": 1}\n' | geochatt --stdin)
+    if [[ "$result" = $'37402\n{"id": 1, "result": "101 E 11TH ST"}' ]]; then
+        echo "PASSED test_stdin"
+    else
+        echo 'FAILED test_stdin'
+        exit 1
+    fi
+}
 
 test_get_address
 test_get_city_council_district
@@ -67,3 +76,4 @@ test_get_municipality
 test_get_parcel
 test_get_parcel_centroid
 test_get_zipcode
+test_stdin